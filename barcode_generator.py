@@ -1,12 +1,12 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-from barcode import Code128
-from barcode.writer import ImageWriter
-from PIL import Image, ImageDraw, ImageFont, ImageTk
-import qrcode
+from PIL import Image, ImageTk
 from datetime import datetime
 import os
+import threading
 from tkcalendar import DateEntry
+import label_renderer
+from label_batch import generate_batch
 
 class ModernBarcodeGeneratorGUI:
     def __init__(self, root):
@@ -214,6 +214,47 @@ class ModernBarcodeGeneratorGUI:
                                activebackground=self.colors['card'])
             rb.pack(anchor='w', pady=5)
         
+        # Payload Format Selection
+        tk.Label(parent,
+                text="Payload Format",
+                bg=self.colors['card'],
+                fg=self.colors['text'],
+                font=('Segoe UI', 10, 'bold'),
+                anchor='w').grid(row=16, column=0, sticky='w', pady=(25, 5), columnspan=2)
+        
+        payload_frame = tk.Frame(parent, bg=self.colors['card'])
+        payload_frame.grid(row=17, column=0, columnspan=2, sticky='ew', pady=(0, 5))
+        
+        self.payload_mode = tk.StringVar(value='legacy')
+        self.include_name = tk.BooleanVar(value=True)
+        
+        modes = [
+            ('📝 Classic (ID|NAME|QTY|LOT|MFG|EXP)', 'legacy'),
+            ('🗜️ Compact (smaller, faster to scan)', 'compact'),
+            ('🌐 GS1 (numeric GTIN product IDs)', 'gs1')
+        ]
+        
+        for text, value in modes:
+            rb = tk.Radiobutton(payload_frame,
+                               text=text,
+                               variable=self.payload_mode,
+                               value=value,
+                               bg=self.colors['card'],
+                               fg=self.colors['text'],
+                               font=('Segoe UI', 10),
+                               selectcolor=self.colors['primary'],
+                               activebackground=self.colors['card'])
+            rb.pack(anchor='w', pady=5)
+        
+        tk.Checkbutton(payload_frame,
+                      text="Include product name in compact codes",
+                      variable=self.include_name,
+                      bg=self.colors['card'],
+                      fg=self.colors['text'],
+                      font=('Segoe UI', 9),
+                      selectcolor=self.colors['primary'],
+                      activebackground=self.colors['card']).pack(anchor='w', pady=(0, 5))
+        
         # Production Date
         self.create_date_field(parent, "Production Date *", 'production_date', 6)
         
@@ -222,7 +263,7 @@ class ModernBarcodeGeneratorGUI:
         
         # Action buttons
         button_frame = tk.Frame(parent, bg=self.colors['card'])
-        button_frame.grid(row=16, column=0, columnspan=2, sticky='ew', pady=(30, 20))
+        button_frame.grid(row=18, column=0, columnspan=2, sticky='ew', pady=(30, 20))
         
         generate_btn = tk.Button(button_frame,
                                 text="🚀 Generate Label",
@@ -360,6 +401,19 @@ class ModernBarcodeGeneratorGUI:
                                pady=10)
         samples_btn.pack(fill='x')
         
+        batch_btn = tk.Button(action_frame,
+                             text="📑 Batch Generate from Manifest",
+                             command=self.generate_batch_from_manifest,
+                             bg='white',
+                             fg=self.colors['primary'],
+                             font=('Segoe UI', 10),
+                             relief='solid',
+                             borderwidth=1,
+                             cursor='hand2',
+                             padx=20,
+                             pady=10)
+        batch_btn.pack(fill='x', pady=(10, 0))
+        
         return panel
         
     def create_footer(self):
@@ -369,129 +423,28 @@ class ModernBarcodeGeneratorGUI:
         footer.pack_propagate(False)
         
         
-    def encode_product_data(self, product_id, name, quantity, lot_no, production_date, expiry_date):
+    def encode_product_data(self, product_id, name, quantity, lot_no, production_date, expiry_date,
+                            payload_mode='legacy', include_name=True):
         """Encode product data in scanner-compatible format"""
-        encoded_data = f"{product_id}|{name}|{quantity}|{lot_no}|{production_date}|{expiry_date}"
-        return encoded_data
-    
-    def create_code128_barcode(self, encoded_data):
-        """Generate Code128 barcode"""
-        try:
-            code128 = Code128(encoded_data, writer=ImageWriter())
-            filename = code128.save(f'{self.output_folder}/temp_barcode',
-                                   options={'write_text': False, 'module_height': 15, 'module_width': 0.3})
-            
-            with Image.open(filename) as img:
-                barcode_img = img.copy()
-            
-            try:
-                os.remove(filename)
-            except:
-                pass
-            
-            return barcode_img
-        except Exception as e:
-            messagebox.showerror("Error", f"Code128 generation failed: {e}")
-            return None
+        return label_renderer.encode_product_data(product_id, name, quantity, lot_no,
+                                                  production_date, expiry_date,
+                                                  payload_mode, include_name)
     
     def create_qr_code(self, encoded_data):
         """Generate QR code"""
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(encoded_data)
-        qr.make(fit=True)
-        
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        return qr_img
+        return label_renderer.create_qr_code(encoded_data)
     
     def create_product_label(self, product_id, name, price, quantity, lot_no,
-                            production_date, expiry_date, barcode_type='both'):
+                            production_date, expiry_date, barcode_type='both',
+                            payload_mode='legacy', include_name=True):
         """Create complete product label with barcode/QR code"""
+        def barcode_failed(e):
+            messagebox.showerror("Error", f"Code128 generation failed: {e}")
         
-        encoded_data = self.encode_product_data(product_id, name, quantity, lot_no,
-                                               production_date, expiry_date)
-        
-        label_width = 700
-        label_height = 500 if barcode_type == 'both' else 450
-        label = Image.new('RGB', (label_width, label_height), 'white')
-        draw = ImageDraw.Draw(label)
-        
-        try:
-            title_font = ImageFont.truetype("arial.ttf", 26)
-            info_font = ImageFont.truetype("arial.ttf", 16)
-            small_font = ImageFont.truetype("arial.ttf", 12)
-            code_font = ImageFont.truetype("courier.ttf", 10)
-        except:
-            title_font = ImageFont.load_default()
-            info_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-            code_font = ImageFont.load_default()
-        
-        draw.rectangle([5, 5, label_width-5, label_height-5], outline='black', width=3)
-        
-        y_position = 25
-        draw.text((label_width//2, y_position), name,
-                 fill='black', font=title_font, anchor='mt')
-        
-        y_position = 70
-        line_spacing = 28
-        
-        info_lines = [
-            f"Product ID: {product_id}",
-            f"Price: ₹{price:.2f}",
-            f"Quantity: {quantity} units",
-            f"Lot No: {lot_no}",
-            f"Mfg Date: {production_date}",
-            f"Exp Date: {expiry_date}"
-        ]
-        
-        for line in info_lines:
-            draw.text((20, y_position), line, fill='black', font=info_font)
-            y_position += line_spacing
-        
-        current_y = y_position + 20
-        
-        if barcode_type in ['barcode', 'both']:
-            barcode_img = self.create_code128_barcode(encoded_data)
-            if barcode_img:
-                barcode_width = 600
-                barcode_height = int(barcode_img.height * (barcode_width / barcode_img.width))
-                barcode_resized = barcode_img.resize((barcode_width, barcode_height))
-                
-                barcode_x = (label_width - barcode_width) // 2
-                label.paste(barcode_resized, (barcode_x, current_y))
-                current_y += barcode_height + 5
-                
-                draw.text((label_width//2, current_y), "Scan this barcode",
-                         fill='black', font=small_font, anchor='mt')
-        
-        if barcode_type in ['qr', 'both']:
-            qr_img = self.create_qr_code(encoded_data)
-            qr_size = 150
-            qr_resized = qr_img.resize((qr_size, qr_size))
-            
-            if barcode_type == 'both':
-                qr_x = label_width - qr_size - 20
-                qr_y = 70
-            else:
-                qr_x = (label_width - qr_size) // 2
-                qr_y = current_y
-            
-            label.paste(qr_resized, (qr_x, qr_y))
-            
-            if barcode_type == 'qr':
-                draw.text((label_width//2, qr_y + qr_size + 10), "Scan QR Code",
-                         fill='black', font=small_font, anchor='mt')
-        
-        format_text = "Format: PROD_ID|NAME|QTY|LOT|MFG_DATE|EXP_DATE"
-        draw.text((label_width//2, label_height - 15), format_text,
-                 fill='gray', font=code_font, anchor='mt')
-        
-        return label, encoded_data
+        return label_renderer.create_product_label(product_id, name, price, quantity, lot_no,
+                                                   production_date, expiry_date, barcode_type,
+                                                   payload_mode, include_name,
+                                                   on_barcode_error=barcode_failed)
     
     def validate_inputs(self):
         """Validate all form inputs"""
@@ -544,11 +497,13 @@ class ModernBarcodeGeneratorGUI:
             production_date = self.production_date.get()
             expiry_date = self.expiry_date.get()
             barcode_type = self.barcode_type.get()
+            payload_mode = self.payload_mode.get()
             
             # Generate label
             label, encoded_data = self.create_product_label(
                 product_id, name, price, quantity, lot_no,
-                production_date, expiry_date, barcode_type
+                production_date, expiry_date, barcode_type,
+                payload_mode, self.include_name.get()
             )
             
             self.current_label_image = label
@@ -606,6 +561,8 @@ class ModernBarcodeGeneratorGUI:
         self.production_date.set_date(datetime.now())
         self.expiry_date.set_date(datetime.now())
         self.barcode_type.set('both')
+        self.payload_mode.set('legacy')
+        self.include_name.set(True)
         
         # Reset placeholders
         self.product_id.insert(0, "e.g., PROD001")
@@ -680,6 +637,38 @@ class ModernBarcodeGeneratorGUI:
         
         messagebox.showinfo("Success", f"Generated {count} sample labels!\n\nLocation: {os.path.abspath(self.output_folder)}")
 
+    def generate_batch_from_manifest(self):
+        """Render labels for every row of a CSV/JSONL manifest in the background"""
+        manifest_path = filedialog.askopenfilename(
+            title="Select Product Manifest",
+            filetypes=[("Manifest files", "*.csv *.jsonl"), ("All files", "*.*")]
+        )
+        if not manifest_path:
+            return
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_folder = os.path.join(self.output_folder, f"batch_{timestamp}")
+        barcode_type = self.barcode_type.get()
+        payload_mode = self.payload_mode.get()
+        include_name = self.include_name.get()
+        
+        # Rendering runs in a process pool; this thread only waits for the summary
+        def run():
+            try:
+                summary = generate_batch(manifest_path, output_folder, barcode_type=barcode_type,
+                                         payload_mode=payload_mode, include_name=include_name)
+                message = (f"Generated {summary['labels']} labels "
+                           f"({len(summary['failed'])} failed)\n"
+                           f"{summary['labels_per_second']} labels/s\n\n"
+                           f"Location: {os.path.abspath(output_folder)}")
+                self.root.after(0, lambda: messagebox.showinfo("Batch Complete", message))
+            except Exception as e:
+                error = str(e)
+                self.root.after(0, lambda: messagebox.showerror("Error", f"Batch generation failed:\n{error}"))
+        
+        threading.Thread(target=run, daemon=True).start()
+        messagebox.showinfo("Batch Started", f"Rendering labels from:\n{manifest_path}")
+
 def main():
     root = tk.Tk()
     app = ModernBarcodeGeneratorGUI(root)
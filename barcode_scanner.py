@@ -1,5 +1,6 @@
 import cv2
 from pyzbar import pyzbar
+from scanner_core import CaptureConfig, open_camera
 
 def decode_qr_code(frame, qr_detector):
     """Decode QR codes using OpenCV's built-in detector"""
@@ -49,8 +50,8 @@ def decode_barcode(frame):
 
 def main():
     """Main function to capture video and scan codes"""
-    # Initialize webcam
-    cap = cv2.VideoCapture(0)
+    # Initialize webcam (settings from scanner_config.json, if present)
+    cap = open_camera(CaptureConfig.load())
     
     if not cap.isOpened():
         print("Error: Could not open webcam")
@@ -0,0 +1,209 @@
+import argparse
+import glob
+import json
+import os
+import time
+from multiprocessing import Pool
+import cv2
+
+from detection import (preprocess, estimate_parameters, estimate_parameters_reduced,
+                       detect_circles, detect_tiled, nodes_from_circles, blueprint_config,
+                       image_size, file_digest, DetectionCache, TILED_MIN_PIXELS)
+
+
+IMAGE_PATTERNS = ('*.png', '*.jpg', '*.jpeg', '*.bmp')
+
+PARAM_KEYS = ('min_dist', 'min_radius', 'max_radius', 'sensitivity')
+
+
+def iter_blueprints(folder):
+    """Blueprint image paths in a folder, in file-name order"""
+    paths = set()
+    for pattern in IMAGE_PATTERNS:
+        paths.update(glob.glob(os.path.join(folder, pattern)))
+        paths.update(glob.glob(os.path.join(folder, pattern.upper())))
+    return sorted(paths)
+
+
+def init_worker():
+    # One OpenCV thread per process; the pool already uses every core
+    cv2.setNumThreads(1)
+
+
+def process_blueprint_job(job):
+    """Process-pool worker: auto-detect, detect and write one blueprint's JSON
+
+    With a cache directory, results of an unchanged image are reused and the
+    image is not even decoded (its result then has no 'load' timing).
+    """
+    image_path, output_folder, overrides, both_paths, cache_dir = job
+    timings = {}
+    try:
+        start = time.perf_counter()
+        width, height = image_size(image_path)
+        tiled = width * height > TILED_MIN_PIXELS
+        cache = DetectionCache(cache_dir) if cache_dir else None
+        digest = file_digest(image_path) if cache else None
+        image = None
+        pre = None
+
+        def load():
+            mark = time.perf_counter()
+            image = cv2.imread(image_path)
+            if image is None:
+                raise ValueError("Could not read image")
+            timings['load'] = time.perf_counter() - mark
+            return image
+
+        # Same steps as Auto-Detect & Process in the GUI
+        mark = time.perf_counter()
+        params = cache.get_parameters(digest) if cache else None
+        cached_params = params is not None
+        if params is None:
+            image = load()
+            mark = time.perf_counter()
+            if tiled:
+                params = estimate_parameters_reduced(image)
+            else:
+                pre = preprocess(image)
+                params = estimate_parameters(pre)
+            if cache:
+                cache.put_parameters(digest, params)
+        params.update(overrides)
+        timings['analyse'] = time.perf_counter() - mark
+
+        mark = time.perf_counter()
+        path = 'both' if both_paths else params['path']
+        circles = cache.get_circles(digest, params, path) if cache else None
+        cached_circles = circles is not None
+        if circles is None:
+            if image is None:
+                image = load()
+                mark = time.perf_counter()
+            if tiled:
+                circles = detect_tiled(image, params, path, workers=1)
+            else:
+                circles = detect_circles(pre if pre is not None else preprocess(image), params, path)
+            if cache:
+                cache.put_circles(digest, params, path, circles)
+        timings['detect'] = time.perf_counter() - mark
+
+        nodes = nodes_from_circles(circles)
+        output_path = os.path.join(
+            output_folder, os.path.splitext(os.path.basename(image_path))[0] + '.json'
+        )
+        with open(output_path, 'w') as f:
+            json.dump(blueprint_config(width, height, nodes), f, indent=2)
+        timings['total'] = time.perf_counter() - start
+
+        return {
+            'image': image_path,
+            'output': output_path,
+            'width': width,
+            'height': height,
+            'nodes': len(nodes),
+            'tiled': tiled,
+            'cached': cached_params and cached_circles,
+            'parameters': {key: params[key] for key in PARAM_KEYS},
+            'path': path,
+            'seconds': {key: round(value, 3) for key, value in timings.items()},
+            'error': None
+        }
+    except Exception as e:
+        return {'image': image_path, 'error': f"{type(e).__name__}: {e}"}
+
+
+def process_folder(input_folder, output_folder, workers=None, overrides=None,
+                   both_paths=False, progress=None, cache_dir=None):
+    """Process every blueprint in a folder across a process pool and return a summary
+
+    `overrides` fixes some of min_dist/min_radius/max_radius/sensitivity
+    instead of taking the auto-detected values. `cache_dir` keeps detection
+    results per image content (see DetectionCache) for repeat runs.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    images = iter_blueprints(input_folder)
+    jobs = [(path, output_folder, overrides or {}, both_paths, cache_dir) for path in images]
+
+    results = []
+    start = time.perf_counter()
+
+    # One image per task: blueprints are few and each one is heavy
+    with Pool(processes=workers, initializer=init_worker) as pool:
+        for result in pool.imap_unordered(process_blueprint_job, jobs):
+            results.append(result)
+            if progress:
+                progress(result, len(results), len(jobs))
+
+    elapsed = time.perf_counter() - start
+    results.sort(key=lambda result: result['image'])
+    failed = [result for result in results if result['error']]
+    processed = [result for result in results if not result['error']]
+
+    summary = {
+        'input_folder': input_folder,
+        'output_folder': output_folder,
+        'images': len(results),
+        'processed': len(processed),
+        'failed': len(failed),
+        'nodes': sum(result['nodes'] for result in processed),
+        'cached': sum(1 for result in processed if result['cached']),
+        'seconds': round(elapsed, 3),
+        'images_per_second': round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+        'results': results
+    }
+    with open(os.path.join(output_folder, 'summary.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Detect PC markers on every blueprint in a folder (no GUI)"
+    )
+    parser.add_argument('folder', help="Folder of blueprint images (png/jpg/bmp)")
+    parser.add_argument('-o', '--output', default=None,
+                        help="Folder for the JSON configurations (default: <folder>/configs)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument('--both-paths', action='store_true',
+                        help="Search both the blurred and the threshold image "
+                             "instead of the path picked by auto-detect")
+    parser.add_argument('--cache', default=None,
+                        help="Folder for cached detection results; unchanged images "
+                             "are not reprocessed on the next run")
+    parser.add_argument('--min-dist', type=int, default=None)
+    parser.add_argument('--min-radius', type=int, default=None)
+    parser.add_argument('--max-radius', type=int, default=None)
+    parser.add_argument('--sensitivity', type=int, default=None)
+    args = parser.parse_args()
+
+    overrides = {
+        key: getattr(args, key) for key in PARAM_KEYS if getattr(args, key) is not None
+    }
+    output = args.output or os.path.join(args.folder, 'configs')
+
+    def report(result, done, total):
+        if result['error']:
+            print(f"  [{done}/{total}] {os.path.basename(result['image'])}: {result['error']}")
+        else:
+            print(f"  [{done}/{total}] {os.path.basename(result['image'])}: "
+                  f"{result['nodes']} nodes in {result['seconds']['total']}s")
+
+    summary = process_folder(args.folder, output, workers=args.workers,
+                             overrides=overrides, both_paths=args.both_paths,
+                             progress=report, cache_dir=args.cache)
+
+    print("=" * 50)
+    print(f"Blueprints processed: {summary['processed']} -> {os.path.abspath(output)}")
+    print(f"Failed: {summary['failed']}")
+    print(f"PC nodes found: {summary['nodes']}")
+    if args.cache:
+        print(f"Restored from cache: {summary['cached']}")
+    print(f"Time: {summary['seconds']}s ({summary['images_per_second']} images/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import cv2
-import numpy as np
 import tkinter as tk
 from tkinter import filedialog, ttk
 from PIL import Image, ImageTk
 import json
+import os
+from occupancy_store import OccupancyStore
+from detection import (PreprocessCache, DetectionWorker, DetectionCache, estimate_parameters, detect_circles,
+                       estimate_parameters_reduced, detect_tiled, needs_tiling, image_size,
+                       load_preview, nodes_from_circles, blueprint_config, file_digest,
+                       MIN_COARSE_RADIUS, TILED_MIN_PIXELS)
 
 class BlueprintProcessor:
     def __init__(self, root):
@@ -17,7 +22,51 @@ class BlueprintProcessor:
         self.nodes = []
         self.display_scale = 1.0
         
+        # Availability counters, kept in step with every toggle
+        self.free_count = 0
+        self.occupied_count = 0
+        
+        # Occupancy persists per blueprint (keyed by file content); other viewers' toggles are polled
+        self.occupancy_file = "blueprint_occupancy.db"
+        self.store = OccupancyStore(self.occupancy_file)
+        self.blueprint_key = None
+        self.blueprint_name = None
+        self.occupancy_seq = 0
+        self.occupancy_generation = None
+        self.OCCUPANCY_POLL_MS = 2000
+        
+        # Auto-detect parameters and circles of previously processed images
+        self.detection_cache = DetectionCache("blueprint_cache")
+        
+        # Preprocessing path picked by the auto-detect analysis ('blur' or 'thresh')
+        self.detected_path = None
+        
+        # Gray/threshold/blur/edge arrays of the loaded image, reused by every detection
+        self.preprocess_cache = PreprocessCache()
+        
+        # Live tuning: slider changes are debounced and detection runs off the Tk thread,
+        # first on a downscaled proxy, then at full resolution once the sliders settle
+        self.worker = DetectionWorker()
+        self.PREVIEW_DEBOUNCE_MS = 150
+        self.FULL_RES_DELAY_MS = 700
+        self.PROXY_MAX_SIDE = 1200
+        self.proxy_image = None
+        self.proxy_scale = 1.0
+        self.proxy_cache = PreprocessCache(max_images=1)
+        self.display_base = None
+        self.preview_after = None
+        self.full_after = None
+        self.submitted_settings = None
+        
+        # Node grid: one canvas, four items per node, hit-tested by cell
+        self.NODE_COLUMNS = 3
+        self.NODE_MIN_WIDTH = 120
+        self.NODE_HEIGHT = 90
+        self.NODE_PAD = 5
+        self.node_cell = (self.NODE_MIN_WIDTH + 2 * self.NODE_PAD, self.NODE_HEIGHT + 2 * self.NODE_PAD)
+        
         self.setup_ui()
+        self.root.after(self.OCCUPANCY_POLL_MS, self.poll_occupancy)
     
     def setup_ui(self):
         # Title
@@ -134,23 +183,17 @@ class BlueprintProcessor:
         )
         self.stats_label.pack()
         
-        # Scrollable frame for nodes
+        # Scrollable canvas for nodes; nodes are canvas items, not widgets
         canvas_frame = tk.Frame(right_frame, bg="#334155")
         canvas_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        canvas = tk.Canvas(canvas_frame, bg="#1e293b", highlightthickness=0)
-        scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview)
-        self.nodes_frame = tk.Frame(canvas, bg="#1e293b")
-        
-        self.nodes_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        self.nodes_canvas = tk.Canvas(canvas_frame, bg="#1e293b", highlightthickness=0, cursor="hand2")
+        scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=self.nodes_canvas.yview)
+        self.nodes_canvas.configure(yscrollcommand=scrollbar.set)
+        self.nodes_canvas.bind("<Button-1>", self.on_node_click)
+        self.nodes_canvas.bind("<Configure>", self.on_nodes_canvas_resize)
         
-        canvas.create_window((0, 0), window=self.nodes_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        canvas.pack(side="left", fill="both", expand=True)
+        self.nodes_canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
         # Detection parameters
@@ -179,6 +222,7 @@ class BlueprintProcessor:
             to=100,
             orient=tk.HORIZONTAL,
             variable=self.min_dist_var,
+            command=self.on_params_changed,
             bg="#334155",
             fg="white",
             troughcolor="#1e293b",
@@ -202,6 +246,7 @@ class BlueprintProcessor:
             to=30,
             orient=tk.HORIZONTAL,
             variable=self.min_radius_var,
+            command=self.on_params_changed,
             bg="#334155",
             fg="white",
             troughcolor="#1e293b",
@@ -225,6 +270,7 @@ class BlueprintProcessor:
             to=100,
             orient=tk.HORIZONTAL,
             variable=self.max_radius_var,
+            command=self.on_params_changed,
             bg="#334155",
             fg="white",
             troughcolor="#1e293b",
@@ -248,6 +294,7 @@ class BlueprintProcessor:
             to=50,
             orient=tk.HORIZONTAL,
             variable=self.sensitivity_var,
+            command=self.on_params_changed,
             bg="#334155",
             fg="white",
             troughcolor="#1e293b",
@@ -255,6 +302,20 @@ class BlueprintProcessor:
         )
         self.sensitivity_slider.grid(row=3, column=1, padx=5, pady=5)
         
+        # Single preprocessing path
+        self.single_path_var = tk.BooleanVar(value=True)
+        tk.Checkbutton(
+            params_frame,
+            text="Single preprocessing pass (picked by Auto Detect)",
+            variable=self.single_path_var,
+            command=self.on_params_changed,
+            bg="#334155",
+            fg="white",
+            selectcolor="#1e293b",
+            activebackground="#334155",
+            font=("Arial", 9)
+        ).grid(row=4, column=0, columnspan=2, sticky="w", padx=5, pady=5)
+        
         # Re-detect button
         self.redetect_btn = tk.Button(
             params_frame,
@@ -271,7 +332,7 @@ class BlueprintProcessor:
             pady=5,
             state=tk.DISABLED
         )
-        self.redetect_btn.grid(row=4, column=0, columnspan=2, pady=10)
+        self.redetect_btn.grid(row=5, column=0, columnspan=2, pady=10)
         
         # Export button
         self.export_btn = tk.Button(
@@ -298,19 +359,114 @@ class BlueprintProcessor:
         )
         
         if file_path:
-            self.original_image = cv2.imread(file_path)
-            self.display_image(self.original_image)
-            self.process_btn.config(state=tk.NORMAL)
-            self.redetect_btn.config(state=tk.NORMAL)
-            self.nodes = []
-            self.update_nodes_display()
+            self.cancel_tuning()
+            self.preprocess_cache = PreprocessCache()
+            self.detected_path = None
+            self.submitted_settings = None
+            self.blueprint_key = None
+            self.occupancy_generation = None
+            self.blueprint_name = os.path.basename(file_path)
+            self.set_nodes([])
+            
+            width, height = image_size(file_path)
+            if width * height <= TILED_MIN_PIXELS:
+                self.original_image = cv2.imread(file_path)
+                self.blueprint_key = file_digest(file_path)
+                self.image_loaded()
+                return
+            
+            # Very large blueprint: show a reduced decode at once, load the full image in the background
+            self.original_image = None
+            self.process_btn.config(state=tk.DISABLED)
+            self.redetect_btn.config(state=tk.DISABLED)
+            self.export_btn.config(state=tk.DISABLED)
+            preview, _ = load_preview(file_path, self.PROXY_MAX_SIDE)
+            self.display_image(preview)
+            self.status_label.config(text=f"🔄 Loading {width}x{height} blueprint...")
+            self.worker.submit(lambda cancelled: (cv2.imread(file_path), file_digest(file_path)),
+                               lambda gen, loaded, error:
+                               self.root.after(0, self.image_loaded, gen, loaded, error, preview))
     
-    def display_image(self, cv_image, window_width=600, window_height=500):
-        # Convert BGR to RGB
-        rgb_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
+    def image_loaded(self, generation=None, loaded=None, error=None, preview=None):
+        if generation is not None:
+            if not self.worker.is_current(generation):
+                return
+            if error is not None or loaded[0] is None:
+                self.status_label.config(text="⚠️ Could not load blueprint image")
+                return
+            self.original_image, self.blueprint_key = loaded
+            self.status_label.config(text="✓ Blueprint loaded (tiled processing)")
+        
+        self.prepare_proxy(preview)
+        self.display_image(self.display_base)
+        self.process_btn.config(state=tk.NORMAL)
+        self.redetect_btn.config(state=tk.NORMAL)
+        
+        # Seen before: stored occupancy, or else cached detection results, show up at once
+        if not self.restore_occupancy() and self.detection_cache.get_parameters(self.blueprint_key):
+            self.auto_detect_and_process()
+    
+    def restore_occupancy(self):
+        """Show the stored layout and occupancy of this blueprint, without detection"""
+        state = self.store.load(self.blueprint_key)
+        height, width = self.original_image.shape[:2]
+        if state is None or (state['width'], state['height']) != (width, height):
+            return False
+        
+        nodes = state['nodes']
+        self.occupancy_seq = state['seq']
+        self.occupancy_generation = state['generation']
+        self.processed_image = self.draw_nodes(nodes)
+        self.display_image(self.processed_image)
+        self.set_nodes(nodes)
+        self.export_btn.config(state=tk.NORMAL if nodes else tk.DISABLED)
+        self.status_label.config(
+            text=f"✓ Restored {len(nodes)} markers ({self.occupied_count} occupied) from {self.occupancy_file}"
+        )
+        return True
+    
+    def save_occupancy_layout(self, nodes):
+        """Keep the stored statuses when detection reproduces the stored layout"""
+        height, width = self.original_image.shape[:2]
+        state = self.store.load(self.blueprint_key)
+        position = lambda node: (node['id'], node['x'], node['y'], node['radius'])
+        
+        if (state is not None and (state['width'], state['height']) == (width, height)
+                and list(map(position, state['nodes'])) == list(map(position, nodes))):
+            for node, stored in zip(nodes, state['nodes']):
+                node['status'] = stored['status']
+            self.occupancy_seq = state['seq']
+            self.occupancy_generation = state['generation']
+            return
         
+        self.occupancy_generation = self.store.save_layout(self.blueprint_key, width, height,
+                                                           nodes, self.blueprint_name)
+        self.occupancy_seq = 0
+    
+    def poll_occupancy(self):
+        """Apply status changes made by other viewers of the same blueprint"""
+        if self.blueprint_key and self.original_image is not None:
+            generation, changes = self.store.changes_since(self.blueprint_key, self.occupancy_seq)
+            
+            # Another viewer re-detected (node ids now refer to its layout), or the
+            # changes we missed were folded into a snapshot
+            if generation is not None and (generation != self.occupancy_generation
+                                           or changes is None):
+                self.restore_occupancy()
+                changes = []
+            
+            for seq, node_id, status in changes:
+                if 1 <= node_id <= len(self.nodes):
+                    self.set_node_status(self.nodes[node_id - 1], status)
+                self.occupancy_seq = seq
+            if changes:
+                self.update_stats()
+        
+        self.root.after(self.OCCUPANCY_POLL_MS, self.poll_occupancy)
+    
+    def display_image(self, cv_image, window_width=600, window_height=500):
         # Calculate scale to fit in window
-        height, width = rgb_image.shape[:2]
+        height, width = cv_image.shape[:2]
         scale_w = window_width / width
         scale_h = window_height / height
         self.display_scale = min(scale_w, scale_h)
@@ -318,7 +474,9 @@ class BlueprintProcessor:
         new_width = int(width * self.display_scale)
         new_height = int(height * self.display_scale)
         
-        resized = cv2.resize(rgb_image, (new_width, new_height))
+        # Resize first, then convert BGR to RGB: no full-size copy of large blueprints
+        resized = cv2.resize(cv_image, (new_width, new_height))
+        resized = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
         
         # Convert to PIL Image
         pil_image = Image.fromarray(resized)
@@ -327,78 +485,141 @@ class BlueprintProcessor:
         self.image_label.config(image=tk_image)
         self.image_label.image = tk_image
     
+    def prepare_proxy(self, source=None):
+        """Downscaled copies of the loaded image for live previews and redraws
+
+        `source` may be a reduced decode of the image to resize from instead.
+        """
+        height, width = self.original_image.shape[:2]
+        if source is None:
+            source = self.original_image
+        
+        self.proxy_scale = min(1.0, self.PROXY_MAX_SIDE / max(height, width))
+        if self.proxy_scale < 1.0:
+            size = (int(width * self.proxy_scale), int(height * self.proxy_scale))
+            self.proxy_image = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+        else:
+            self.proxy_image = self.original_image
+        self.proxy_cache = PreprocessCache(max_images=1)
+        
+        # Preview overlays are drawn on an image already at display size
+        display_scale = min(600 / width, 500 / height)
+        size = (int(width * display_scale), int(height * display_scale))
+        self.display_base = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+    
+    def current_params(self):
+        return {
+            'min_dist': self.min_dist_var.get(),
+            'min_radius': self.min_radius_var.get(),
+            'max_radius': self.max_radius_var.get(),
+            'sensitivity': self.sensitivity_var.get()
+        }
+    
+    def current_path(self):
+        # One preprocessing path when auto-detect has picked one, otherwise both
+        if self.single_path_var.get() and self.detected_path:
+            return self.detected_path
+        return 'both'
+    
+    def cancel_tuning(self):
+        for after_id in (self.preview_after, self.full_after):
+            if after_id:
+                self.root.after_cancel(after_id)
+        self.preview_after = None
+        self.full_after = None
+    
+    def on_params_changed(self, _value=None):
+        """Slider moved: debounce a proxy preview and a later full-resolution pass"""
+        if self.original_image is None:
+            return
+        
+        # Tk fires Scale commands for programmatic set() too, at idle time;
+        # settings already submitted (e.g. by auto-detect) need no rerun
+        if (self.current_params(), self.current_path()) == self.submitted_settings:
+            return
+        
+        self.cancel_tuning()
+        self.preview_after = self.root.after(self.PREVIEW_DEBOUNCE_MS, self.run_preview)
+        self.full_after = self.root.after(self.FULL_RES_DELAY_MS, self.process_blueprint)
+    
+    def run_preview(self):
+        """Detect on the downscaled proxy with parameters scaled to match"""
+        self.preview_after = None
+        scale = self.proxy_scale
+        params = self.current_params()
+        
+        # Proxy too coarse for these markers: wait for the full-resolution pass
+        if scale >= 1.0 or params['max_radius'] * scale < MIN_COARSE_RADIUS:
+            return
+        
+        proxy_params = {
+            'min_dist': max(1, int(params['min_dist'] * scale)),
+            'min_radius': max(1, int(params['min_radius'] * scale)),
+            'max_radius': max(2, int(round(params['max_radius'] * scale))),
+            'sensitivity': max(5, int(round(params['sensitivity'] * scale)))
+        }
+        path = self.current_path()
+        proxy, cache = self.proxy_image, self.proxy_cache
+        
+        def job(cancelled):
+            circles = detect_circles(cache.get(proxy), proxy_params, path,
+                                     coarse_max_side=0, cancelled=cancelled)
+            return circles / scale
+        
+        self.status_label.config(text="🔄 Previewing...")
+        self.worker.submit(job, lambda gen, result, error:
+                           self.root.after(0, self.show_preview, gen, result, error))
+    
+    def show_preview(self, generation, circles, error):
+        if not self.worker.is_current(generation) or error is not None:
+            return
+        
+        preview = self.display_base.copy()
+        scale = preview.shape[1] / self.original_image.shape[1]
+        for x, y, r in circles:
+            cv2.circle(preview, (int(x * scale), int(y * scale)), max(1, int(r * scale)), (0, 255, 0), 1)
+        
+        self.display_image(preview)
+        self.status_label.config(text=f"👁️ Preview: {len(circles)} markers (full resolution follows)")
+    
     def auto_detect_and_process(self):
         """Automatically determine optimal detection parameters"""
         if self.original_image is None:
             return
         
+        self.cancel_tuning()
         self.status_label.config(text="🔄 Analyzing image...")
-        self.root.update()
         
-        # Analyze image to determine optimal parameters
-        gray = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2GRAY)
-        height, width = gray.shape
+        # Analyze image to determine optimal parameters (off the Tk thread)
+        image, cache = self.original_image, self.preprocess_cache
+        key, results = self.blueprint_key, self.detection_cache
+        
+        def job(cancelled):
+            params = results.get_parameters(key)
+            if params is None:
+                if needs_tiling(image):
+                    params = estimate_parameters_reduced(image)
+                else:
+                    params = estimate_parameters(cache.get(image))
+                results.put_parameters(key, params)
+            return params
+        
+        self.worker.submit(job,
+                           lambda gen, result, error:
+                           self.root.after(0, self.apply_auto_parameters, gen, result, error))
+    
+    def apply_auto_parameters(self, generation, params, error):
+        if not self.worker.is_current(generation):
+            return
+        if error is not None:
+            self.status_label.config(text=f"⚠️ Analysis failed: {error}")
+            return
         
-        # 1. Detect potential marker sizes using contour analysis
-        thresh = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY_INV, 11, 2
-        )
-        
-        kernel = np.ones((3, 3), np.uint8)
-        thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
-        
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        
-        # Analyze contour sizes
-        circular_sizes = []
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            perimeter = cv2.arcLength(contour, True)
-            if perimeter > 0:
-                circularity = 4 * np.pi * area / (perimeter * perimeter)
-                # If reasonably circular (circularity > 0.5)
-                if circularity > 0.5 and area > 50:
-                    # Estimate radius
-                    radius = np.sqrt(area / np.pi)
-                    circular_sizes.append(radius)
-        
-        # Determine radius range
-        if circular_sizes:
-            circular_sizes = np.array(circular_sizes)
-            median_radius = np.median(circular_sizes)
-            std_radius = np.std(circular_sizes)
-            
-            min_radius = max(3, int(median_radius - std_radius * 1.5))
-            max_radius = min(100, int(median_radius + std_radius * 1.5))
-            
-            # Ensure reasonable range
-            if max_radius - min_radius < 10:
-                min_radius = max(3, int(median_radius * 0.5))
-                max_radius = min(100, int(median_radius * 1.5))
-        else:
-            # Default values if no circles found in pre-analysis
-            min_radius = 5
-            max_radius = 50
-        
-        # 2. Determine min distance based on image size and expected density
-        # Assume markers should be at least 2x their size apart
-        avg_radius = (min_radius + max_radius) / 2
-        min_dist = max(15, int(avg_radius * 2))
-        
-        # 3. Determine sensitivity based on image contrast
-        blur = cv2.GaussianBlur(gray, (9, 9), 2)
-        edges = cv2.Canny(blur, 50, 150)
-        edge_density = np.sum(edges > 0) / (width * height)
-        
-        # More edges = need higher threshold (less sensitive)
-        if edge_density > 0.15:
-            sensitivity = 25
-        elif edge_density > 0.10:
-            sensitivity = 20
-        else:
-            sensitivity = 15
+        min_dist = params['min_dist']
+        min_radius = params['min_radius']
+        max_radius = params['max_radius']
+        sensitivity = params['sensitivity']
+        self.detected_path = params['path']
         
         # Update sliders
         self.min_dist_var.set(min_dist)
@@ -407,124 +628,60 @@ class BlueprintProcessor:
         self.sensitivity_var.set(sensitivity)
         
         self.status_label.config(
-            text=f"✓ Auto-detected: MinDist={min_dist}, Radius={min_radius}-{max_radius}, Sens={sensitivity}"
+            text=f"✓ Auto-detected: MinDist={min_dist}, Radius={min_radius}-{max_radius}, "
+                 f"Sens={sensitivity}, Path={self.detected_path}"
         )
-        self.root.update()
         
         # Now process with these parameters
         self.process_blueprint()
     
     def process_blueprint(self):
+        """Full-resolution detection on the worker thread"""
         if self.original_image is None:
             return
         
-        # Create a copy for processing
-        image = self.original_image.copy()
-        height, width = image.shape[:2]
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        
-        # Apply multiple preprocessing techniques for better detection
-        # 1. Adaptive thresholding
-        thresh = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY_INV, 11, 2
-        )
-        
-        # 2. Morphological operations to clean up
-        kernel = np.ones((3, 3), np.uint8)
-        thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-        thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
-        
-        # 3. Apply Gaussian blur
-        blurred = cv2.GaussianBlur(gray, (9, 9), 2)
-        
-        # Get parameters from sliders
-        min_dist = self.min_dist_var.get()
-        min_radius = self.min_radius_var.get()
-        max_radius = self.max_radius_var.get()
-        sensitivity = self.sensitivity_var.get()
-        
-        # Detect circles using HoughCircles with adjusted parameters
-        circles = cv2.HoughCircles(
-            blurred,
-            cv2.HOUGH_GRADIENT,
-            dp=1,
-            minDist=min_dist,
-            param1=50,
-            param2=sensitivity,
-            minRadius=min_radius,
-            maxRadius=max_radius
-        )
-        
-        # Also try on thresholded image
-        circles2 = cv2.HoughCircles(
-            thresh,
-            cv2.HOUGH_GRADIENT,
-            dp=1,
-            minDist=min_dist,
-            param1=50,
-            param2=sensitivity,
-            minRadius=min_radius,
-            maxRadius=max_radius
-        )
-        
-        # Combine results
-        all_circles = []
-        if circles is not None:
-            all_circles.extend(circles[0, :])
-        if circles2 is not None:
-            all_circles.extend(circles2[0, :])
-        
-        # Remove duplicates (circles that are too close to each other)
-        unique_circles = []
-        for circle in all_circles:
-            x, y, r = circle
-            is_duplicate = False
-            for uc in unique_circles:
-                ux, uy, ur = uc
-                dist = np.sqrt((x - ux)**2 + (y - uy)**2)
-                if dist < min_dist:
-                    is_duplicate = True
-                    break
-            if not is_duplicate:
-                unique_circles.append(circle)
-        
-        self.nodes = []
+        self.cancel_tuning()
+        params = self.current_params()
+        path = self.current_path()
+        self.submitted_settings = (params, path)
+        image, cache = self.original_image, self.preprocess_cache
+        key, results = self.blueprint_key, self.detection_cache
+        
+        # Coarse pass on a downscaled copy, refined in small full-resolution windows;
+        # very large images go through in overlapping tiles
+        def job(cancelled):
+            circles = results.get_circles(key, params, path)
+            if circles is not None:
+                return circles
+            
+            if needs_tiling(image):
+                circles = detect_tiled(image, params, path, cancelled=cancelled)
+            else:
+                circles = detect_circles(cache.get(image), params, path, cancelled=cancelled)
+            
+            # A cancelled run returns a partial result; never cache that
+            if not cancelled():
+                results.put_circles(key, params, path, circles)
+            return circles
+        
+        self.status_label.config(text="🔄 Detecting markers...")
+        self.worker.submit(job, lambda gen, result, error:
+                           self.root.after(0, self.show_detection, gen, result, error))
+    
+    def show_detection(self, generation, unique_circles, error):
+        if not self.worker.is_current(generation):
+            return
+        if error is not None:
+            self.status_label.config(text=f"⚠️ Detection failed: {error}")
+            return
         
-        if len(unique_circles) > 0:
-            for i, circle in enumerate(unique_circles):
-                x, y, r = circle
-                x, y, r = int(x), int(y), int(r)
-                
-                # Draw circle on image
-                cv2.circle(image, (x, y), r, (0, 255, 0), 3)
-                cv2.circle(image, (x, y), 2, (0, 255, 0), -1)
-                
-                # Draw label
-                label = f"PC-{i+1}"
-                cv2.putText(
-                    image,
-                    label,
-                    (x + r + 5, y + 5),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.6,
-                    (0, 255, 0),
-                    2
-                )
-                
-                # Store node info
-                self.nodes.append({
-                    'id': i + 1,
-                    'x': x,
-                    'y': y,
-                    'radius': r,
-                    'status': 'free'
-                })
+        nodes = nodes_from_circles(unique_circles)
+        image = self.draw_nodes(nodes)
+        if self.blueprint_key and nodes:
+            self.save_occupancy_layout(nodes)
         
         # If no circles found, show message on image
-        if len(self.nodes) == 0:
+        if len(nodes) == 0:
             cv2.putText(
                 image,
                 "No circles detected. Try manual adjustment.",
@@ -536,89 +693,165 @@ class BlueprintProcessor:
             )
             self.status_label.config(text="⚠️ No markers detected - try adjusting settings manually")
         else:
-            self.status_label.config(text=f"✓ Detected {len(self.nodes)} markers successfully!")
+            self.status_label.config(text=f"✓ Detected {len(nodes)} markers successfully!")
         
         self.processed_image = image
         self.display_image(image)
-        self.update_nodes_display()
+        self.set_nodes(nodes)
         self.export_btn.config(state=tk.NORMAL if len(self.nodes) > 0 else tk.DISABLED)
     
+    def draw_nodes(self, nodes):
+        """Copy of the blueprint with the nodes marked"""
+        # Very large blueprints are drawn at display size
+        if needs_tiling(self.original_image):
+            image = self.display_base.copy()
+        else:
+            image = self.original_image.copy()
+        scale = image.shape[1] / self.original_image.shape[1]
+        
+        if len(nodes) > 0:
+            for node in nodes:
+                x, y, r = node['x'], node['y'], node['radius']
+                dx, dy, dr = int(x * scale), int(y * scale), max(1, int(r * scale))
+                
+                # Draw circle on image
+                cv2.circle(image, (dx, dy), dr, (0, 255, 0), 3)
+                cv2.circle(image, (dx, dy), 2, (0, 255, 0), -1)
+                
+                # Draw label
+                label = f"PC-{node['id']}"
+                cv2.putText(
+                    image,
+                    label,
+                    (dx + dr + 5, dy + 5),
+                    cv2.FONT_HERSHEY_SIMPLEX,
+                    0.6,
+                    (0, 255, 0),
+                    2
+                )
+        
+        return image
+    
+    def set_nodes(self, nodes):
+        """Replace the node list: count statuses once, then lay out the grid"""
+        self.nodes = nodes
+        self.free_count = sum(1 for node in nodes if node['status'] == 'free')
+        self.occupied_count = len(nodes) - self.free_count
+        self.update_nodes_display()
+    
     def update_nodes_display(self):
-        # Clear existing nodes
-        for widget in self.nodes_frame.winfo_children():
-            widget.destroy()
+        """Lay out the whole node grid (new detection or canvas resize)"""
+        canvas = self.nodes_canvas
+        canvas.delete('node')
         
         if not self.nodes:
             self.stats_label.config(text="No nodes detected yet")
+            canvas.configure(scrollregion=(0, 0, 0, 0))
             return
         
-        # Update stats
-        free_count = sum(1 for node in self.nodes if node['status'] == 'free')
-        occupied_count = len(self.nodes) - free_count
+        self.update_stats()
         
+        # Columns share the canvas width, but never get narrower than NODE_MIN_WIDTH
+        width = max(canvas.winfo_width(), self.NODE_COLUMNS * (self.NODE_MIN_WIDTH + 2 * self.NODE_PAD))
+        self.node_cell = (width // self.NODE_COLUMNS, self.NODE_HEIGHT + 2 * self.NODE_PAD)
+        
+        for i, node in enumerate(self.nodes):
+            self.draw_node(i, node)
+        
+        rows = (len(self.nodes) + self.NODE_COLUMNS - 1) // self.NODE_COLUMNS
+        canvas.configure(scrollregion=(0, 0, width, rows * self.node_cell[1]))
+    
+    def update_stats(self):
         self.stats_label.config(
-            text=f"Total PCs: {len(self.nodes)} | Available: {free_count} | Occupied: {occupied_count}"
+            text=f"Total PCs: {len(self.nodes)} | Available: {self.free_count} | "
+                 f"Occupied: {self.occupied_count}"
         )
+    
+    def node_style(self, node):
+        if node['status'] == 'free':
+            return "#10b981", "✓", "Available"
+        return "#ef4444", "✗", "Occupied"
+    
+    def draw_node(self, index, node):
+        """Create the four canvas items of one node, tagged node<id> plus their role"""
+        canvas = self.nodes_canvas
+        cell_w, cell_h = self.node_cell
+        x0 = (index % self.NODE_COLUMNS) * cell_w + self.NODE_PAD
+        y0 = (index // self.NODE_COLUMNS) * cell_h + self.NODE_PAD
+        x1 = x0 + cell_w - 2 * self.NODE_PAD
+        cx = (x0 + x1) // 2
+        
+        color, status_icon, status_text = self.node_style(node)
+        tag = f"node{node['id']}"
+        
+        canvas.create_rectangle(x0, y0, x1, y0 + self.NODE_HEIGHT, fill=color, outline="#1e293b",
+                                width=2, tags=('node', tag, 'bg'))
+        canvas.create_text(cx, y0 + 24, text=status_icon, font=("Arial", 20, "bold"),
+                           fill="white", tags=('node', tag, 'icon'))
+        canvas.create_text(cx, y0 + 52, text=f"PC-{node['id']}", font=("Arial", 12, "bold"),
+                           fill="white", tags=('node', tag))
+        canvas.create_text(cx, y0 + 73, text=status_text, font=("Arial", 9),
+                           fill="white", tags=('node', tag, 'status'))
+    
+    def refresh_node(self, node):
+        """Restyle one node's existing items in place"""
+        canvas = self.nodes_canvas
+        color, status_icon, status_text = self.node_style(node)
+        tag = f"node{node['id']}"
+        
+        canvas.itemconfigure(f"{tag}&&bg", fill=color)
+        canvas.itemconfigure(f"{tag}&&icon", text=status_icon)
+        canvas.itemconfigure(f"{tag}&&status", text=status_text)
+    
+    def on_node_click(self, event):
+        """Map the click to a grid cell; no per-node bindings needed"""
+        x = self.nodes_canvas.canvasx(event.x)
+        y = self.nodes_canvas.canvasy(event.y)
+        cell_w, cell_h = self.node_cell
+        col, row = int(x // cell_w), int(y // cell_h)
+        if col >= self.NODE_COLUMNS:
+            return
         
-        # Create node buttons in grid
-        for i, node in enumerate(self.nodes):
-            row = i // 3
-            col = i % 3
-            
-            color = "#10b981" if node['status'] == 'free' else "#ef4444"
-            hover_color = "#059669" if node['status'] == 'free' else "#dc2626"
-            
-            node_frame = tk.Frame(
-                self.nodes_frame,
-                bg=color,
-                relief=tk.RAISED,
-                bd=2,
-                cursor="hand2"
-            )
-            node_frame.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
-            
-            # Make frame clickable
-            node_frame.bind("<Button-1>", lambda e, n=node: self.toggle_node_status(n))
-            
-            status_icon = "✓" if node['status'] == 'free' else "✗"
-            status_text = "Available" if node['status'] == 'free' else "Occupied"
-            
-            icon_label = tk.Label(
-                node_frame,
-                text=status_icon,
-                font=("Arial", 20, "bold"),
-                bg=color,
-                fg="white"
-            )
-            icon_label.pack(pady=(10, 5))
-            icon_label.bind("<Button-1>", lambda e, n=node: self.toggle_node_status(n))
-            
-            id_label = tk.Label(
-                node_frame,
-                text=f"PC-{node['id']}",
-                font=("Arial", 12, "bold"),
-                bg=color,
-                fg="white"
-            )
-            id_label.pack()
-            id_label.bind("<Button-1>", lambda e, n=node: self.toggle_node_status(n))
-            
-            status_label = tk.Label(
-                node_frame,
-                text=status_text,
-                font=("Arial", 9),
-                bg=color,
-                fg="white"
-            )
-            status_label.pack(pady=(0, 10))
-            status_label.bind("<Button-1>", lambda e, n=node: self.toggle_node_status(n))
-            
-            # Configure grid weights
-            self.nodes_frame.grid_columnconfigure(col, weight=1, minsize=120)
+        # Ignore clicks in the padding between nodes
+        if not (self.NODE_PAD <= x - col * cell_w < cell_w - self.NODE_PAD
+                and self.NODE_PAD <= y - row * cell_h < cell_h - self.NODE_PAD):
+            return
+        
+        index = row * self.NODE_COLUMNS + col
+        if 0 <= index < len(self.nodes):
+            self.toggle_node_status(self.nodes[index])
+    
+    def on_nodes_canvas_resize(self, event):
+        # Only a width change moves the columns
+        width = max(event.width, self.NODE_COLUMNS * (self.NODE_MIN_WIDTH + 2 * self.NODE_PAD))
+        if self.nodes and width // self.NODE_COLUMNS != self.node_cell[0]:
+            self.update_nodes_display()
+    
+    def set_node_status(self, node, status):
+        """Change one node's status: adjust the counters and restyle only its items"""
+        if node['status'] == status:
+            return
+        node['status'] = status
+        if status == 'occupied':
+            self.free_count -= 1
+            self.occupied_count += 1
+        else:
+            self.free_count += 1
+            self.occupied_count -= 1
+        self.refresh_node(node)
     
     def toggle_node_status(self, node):
-        node['status'] = 'occupied' if node['status'] == 'free' else 'free'
-        self.update_nodes_display()
+        status = 'occupied' if node['status'] == 'free' else 'free'
+        self.set_node_status(node, status)
+        
+        # Our own event comes back through poll_occupancy as a no-op
+        if self.blueprint_key and self.occupancy_generation is not None:
+            seq = self.store.record(self.blueprint_key, node['id'], status, self.occupancy_generation)
+            if seq is None:
+                # The layout was replaced by another viewer; show that one instead
+                self.restore_occupancy()
+                return
+        self.update_stats()
     
     def export_config(self):
         if not self.nodes:
@@ -631,13 +864,8 @@ class BlueprintProcessor:
         )
         
         if file_path:
-            config = {
-                'blueprint_info': {
-                    'width': self.original_image.shape[1],
-                    'height': self.original_image.shape[0]
-                },
-                'nodes': self.nodes
-            }
+            height, width = self.original_image.shape[:2]
+            config = blueprint_config(width, height, self.nodes)
             
             with open(file_path, 'w') as f:
                 json.dump(config, f, indent=2)
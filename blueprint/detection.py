@@ -0,0 +1,635 @@
+import hashlib
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+
+
+# Images whose longer side exceeds this get a coarse pass on a downscaled copy
+COARSE_MAX_SIDE = 1600
+
+# Below this radius (in coarse pixels) markers are too small to find coarsely
+MIN_COARSE_RADIUS = 4
+
+# 'both' runs Hough on the blurred gray and the threshold image and merges them;
+# 'blur' / 'thresh' use the single path picked by estimate_parameters
+PREPROCESS_PATHS = ('both', 'blur', 'thresh')
+
+# Images with more pixels than this are preprocessed and detected tile by tile,
+# so the working buffers are bounded by the tile size instead of the image size
+TILED_MIN_PIXELS = 40_000_000
+TILE_SIZE = 2048
+
+# Extra tile overlap on top of the marker size: covers the blur and threshold kernels
+TILE_MARGIN = 16
+
+# Auto-detect on tiled images analyses a copy downscaled to this longer side
+ANALYSIS_MAX_SIDE = 4096
+
+# Bump when detection changes enough that cached results should be recomputed
+DETECTION_CACHE_VERSION = 1
+
+# Circle results kept per image; older slider settings are evicted first
+CACHED_SETTINGS_PER_IMAGE = 8
+
+# cv2.imread flags that decode JPEG/PNG at a fraction of the full resolution
+REDUCED_COLOR_FLAGS = {
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+}
+
+
+def preprocess(image, block_size=11, c=2, blur_size=9, blur_sigma=2):
+    """Grayscale, cleaned adaptive threshold and blurred gray for one image"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    # 1. Adaptive thresholding
+    thresh = cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+        cv2.THRESH_BINARY_INV, block_size, c
+    )
+
+    # 2. Morphological operations to clean up
+    kernel = np.ones((3, 3), np.uint8)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, kernel)
+
+    # 3. Gaussian blur
+    blurred = cv2.GaussianBlur(gray, (blur_size, blur_size), blur_sigma)
+
+    # 4. Edge map, used for the contrast estimate and to score circles
+    edges = cv2.Canny(blurred, 50, 150)
+
+    return {'gray': gray, 'thresh': thresh, 'blurred': blurred, 'edges': edges}
+
+
+class PreprocessCache:
+    """Preprocessed arrays of recent images, so re-detection only reruns Hough
+
+    Entries are keyed by the image object and the preprocessing options. Each
+    entry keeps a reference to its image, so the id cannot be reused while
+    the entry is alive. The auto-detect analysis and the downscaled coarse
+    copies are memoized on the same entry.
+    """
+
+    def __init__(self, max_images=2):
+        self.max_images = max_images
+        self.entries = OrderedDict()
+
+    def get(self, image, **options):
+        key = (id(image), tuple(sorted(options.items())))
+        entry = self.entries.get(key)
+        if entry is not None and entry['image'] is image:
+            self.entries.move_to_end(key)
+            return entry
+
+        entry = preprocess(image, **options)
+        entry['image'] = image
+        self.entries[key] = entry
+        while len(self.entries) > self.max_images:
+            self.entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+
+def estimate_parameters(pre):
+    """Pick Hough parameters and a preprocessing path from the marker analysis"""
+    if 'analysis' in pre:
+        return dict(pre['analysis'])
+
+    thresh = pre['thresh']
+    height, width = thresh.shape
+
+    # 1. Detect potential marker sizes using contour analysis
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    circular_sizes = []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        perimeter = cv2.arcLength(contour, True)
+        if perimeter > 0:
+            circularity = 4 * np.pi * area / (perimeter * perimeter)
+            # If reasonably circular (circularity > 0.5)
+            if circularity > 0.5 and area > 50:
+                circular_sizes.append(np.sqrt(area / np.pi))
+
+    # Determine radius range
+    if circular_sizes:
+        circular_sizes = np.array(circular_sizes)
+        median_radius = np.median(circular_sizes)
+        std_radius = np.std(circular_sizes)
+
+        min_radius = max(3, int(median_radius - std_radius * 1.5))
+        max_radius = min(100, int(median_radius + std_radius * 1.5))
+
+        # Ensure reasonable range
+        if max_radius - min_radius < 10:
+            min_radius = max(3, int(median_radius * 0.5))
+            max_radius = min(100, int(median_radius * 1.5))
+    else:
+        min_radius = 5
+        max_radius = 50
+
+    # 2. Markers should be at least 2x their size apart
+    avg_radius = (min_radius + max_radius) / 2
+    min_dist = max(15, int(avg_radius * 2))
+
+    # 3. More edges = need higher threshold (less sensitive)
+    edge_density = np.count_nonzero(pre['edges']) / (width * height)
+
+    if edge_density > 0.15:
+        sensitivity = 25
+    elif edge_density > 0.10:
+        sensitivity = 20
+    else:
+        sensitivity = 15
+
+    # Solid markers on a clean drawing show up crisply in the threshold image;
+    # busy or noisy scans are more reliable on the blurred gray
+    if len(circular_sizes) >= 3 and edge_density <= 0.10:
+        path = 'thresh'
+    else:
+        path = 'blur'
+
+    pre['analysis'] = {
+        'min_dist': min_dist,
+        'min_radius': min_radius,
+        'max_radius': max_radius,
+        'sensitivity': sensitivity,
+        'path': path,
+        'edge_density': edge_density
+    }
+    return dict(pre['analysis'])
+
+
+def hough(source, min_dist, min_radius, max_radius, sensitivity):
+    """HoughCircles as an (N, 3) float array of x, y, r (strongest first)"""
+    circles = cv2.HoughCircles(
+        source,
+        cv2.HOUGH_GRADIENT,
+        dp=1,
+        minDist=max(1, min_dist),
+        param1=50,
+        param2=max(1, sensitivity),
+        minRadius=min_radius,
+        maxRadius=max_radius
+    )
+    if circles is None:
+        return np.empty((0, 3), np.float32)
+    return circles[0].astype(np.float32)
+
+
+def refine_in_roi(source, candidates, params, pad, cancelled=None):
+    """Re-run Hough at full resolution only in small windows around candidates"""
+    height, width = source.shape[:2]
+    half = params['max_radius'] + pad
+    refined = []
+
+    for i, (cx, cy, _) in enumerate(candidates):
+        # A newer request makes this result useless; stop early
+        if cancelled and i % 64 == 0 and cancelled():
+            break
+
+        x0, y0 = max(0, int(cx) - half), max(0, int(cy) - half)
+        x1, y1 = min(width, int(cx) + half + 1), min(height, int(cy) + half + 1)
+        if x1 - x0 <= 2 * params['min_radius'] or y1 - y0 <= 2 * params['min_radius']:
+            continue
+
+        # One marker per window: the strongest circle is the refined candidate
+        found = hough(source[y0:y1, x0:x1], 2 * half, params['min_radius'],
+                      params['max_radius'], params['sensitivity'])
+        if len(found):
+            x, y, r = found[0]
+            refined.append((x + x0, y + y0, r))
+
+    if not refined:
+        return np.empty((0, 3), np.float32)
+    return np.array(refined, np.float32)
+
+
+def detect_coarse_to_fine(source, params, coarse_max_side=COARSE_MAX_SIDE, small=None,
+                          cancelled=None):
+    """Find candidates on a downscaled copy, then confirm them at full resolution
+
+    `small` may be a precomputed downscaled copy of `source` (see detect_circles).
+    """
+    height, width = source.shape[:2]
+    scale = coarse_max_side / max(height, width) if coarse_max_side else 1.0
+
+    # Small images, or markers too small to survive downscaling: one full pass
+    if scale >= 1.0 or params['max_radius'] * scale < MIN_COARSE_RADIUS:
+        return hough(source, params['min_dist'], params['min_radius'],
+                     params['max_radius'], params['sensitivity'])
+
+    if small is None:
+        small = cv2.resize(source, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+    # Votes scale with circumference, so the coarse threshold shrinks with the image
+    coarse = hough(
+        small,
+        params['min_dist'] * scale,
+        max(1, int(params['min_radius'] * scale)),
+        max(2, int(math.ceil(params['max_radius'] * scale))),
+        max(5, int(round(params['sensitivity'] * scale)))
+    )
+    if len(coarse) == 0:
+        return coarse
+
+    candidates = coarse / scale
+    pad = int(math.ceil(1 / scale)) + 2
+    return refine_in_roi(source, candidates, params, pad, cancelled)
+
+
+def score_circles(edges, circles, samples=36):
+    """Fraction of each circle's circumference backed by an edge pixel (0..1)"""
+    if len(circles) == 0:
+        return np.empty(0, np.float32)
+
+    height, width = edges.shape
+    angles = np.linspace(0, 2 * np.pi, samples, endpoint=False)
+    cos, sin = np.cos(angles), np.sin(angles)
+
+    # Accept an edge one pixel inside or outside the fitted radius
+    support = np.zeros((len(circles), samples), bool)
+    for offset in (-1, 0, 1):
+        radius = circles[:, 2:3] + offset
+        xs = np.clip(np.rint(circles[:, 0:1] + radius * cos), 0, width - 1).astype(np.intp)
+        ys = np.clip(np.rint(circles[:, 1:2] + radius * sin), 0, height - 1).astype(np.intp)
+        support |= edges[ys, xs] > 0
+
+    return support.mean(axis=1).astype(np.float32)
+
+
+def suppress_duplicates(circles, scores, min_dist):
+    """Grid-hash non-maximum suppression: of circles closer than min_dist keep the best
+
+    Circles are hashed into min_dist-sized cells, so close pairs can only sit in
+    neighbouring cells. The pairs are found with sorted-key lookups in NumPy and
+    one linear pass in score order then drops the weaker circle of each pair.
+    """
+    n = len(circles)
+    if n < 2 or min_dist <= 0:
+        return circles
+
+    order = np.argsort(-scores, kind='stable')
+    circles = circles[order]
+    points = circles[:, :2].astype(np.float64)
+
+    cells = np.floor(points / min_dist).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    span = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * span + cells[:, 1]
+
+    by_key = np.argsort(keys, kind='stable')
+    sorted_keys = keys[by_key]
+    index = np.arange(n)
+    pair_i, pair_j = [], []
+
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            neighbour = keys + dx * span + dy
+            lo = np.searchsorted(sorted_keys, neighbour, 'left')
+            counts = np.searchsorted(sorted_keys, neighbour, 'right') - lo
+            total = int(counts.sum())
+            if total == 0:
+                continue
+
+            # Expand each circle's [lo, hi) range of neighbours into flat pairs
+            starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+            i = np.repeat(index, counts)
+            j = by_key[np.arange(total) + starts]
+
+            # Lower index = better score; keep each pair once, as (better, worse)
+            keep = (j > i) & (((points[i] - points[j]) ** 2).sum(axis=1) < min_dist * min_dist)
+            pair_i.append(i[keep])
+            pair_j.append(j[keep])
+
+    if not pair_i:
+        return circles
+
+    pair_i = np.concatenate(pair_i)
+    pair_j = np.concatenate(pair_j)
+    by_better = np.argsort(pair_i, kind='stable')
+    pair_i, pair_j = pair_i[by_better], pair_j[by_better]
+    bounds = np.searchsorted(pair_i, np.arange(n + 1))
+
+    suppressed = np.zeros(n, bool)
+    for i in np.unique(pair_i):
+        if not suppressed[i]:
+            suppressed[pair_j[bounds[i]:bounds[i + 1]]] = True
+
+    return circles[~suppressed]
+
+
+def detect_circles(pre, params, path='both', coarse_max_side=COARSE_MAX_SIDE, cancelled=None):
+    """Detect marker circles on the preprocessed image; returns unique (x, y, r)
+
+    `cancelled` is an optional callable; when it returns True the remaining
+    work is skipped and a partial result is returned.
+    """
+    if path not in PREPROCESS_PATHS:
+        raise ValueError(f"Unknown preprocessing path '{path}'")
+
+    names = []
+    if path in ('both', 'blur'):
+        names.append('blurred')
+    if path in ('both', 'thresh'):
+        names.append('thresh')
+
+    # Downscaled copies do not depend on the Hough parameters; keep them on `pre`
+    coarse = pre.setdefault('coarse', {})
+    found = []
+    for name in names:
+        if cancelled and cancelled():
+            break
+        source = pre[name]
+        scale = coarse_max_side / max(source.shape[:2]) if coarse_max_side else 1.0
+        small = None
+        if scale < 1.0:
+            small = coarse.get((name, coarse_max_side))
+            if small is None:
+                small = cv2.resize(source, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                coarse[(name, coarse_max_side)] = small
+        found.append(detect_coarse_to_fine(source, params, coarse_max_side, small, cancelled))
+    all_circles = np.concatenate(found) if found else np.empty((0, 3), np.float32)
+
+    scores = score_circles(pre['edges'], all_circles)
+    return suppress_duplicates(all_circles, scores, params['min_dist'])
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file's bytes, read in chunks; identifies a blueprint across renames"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_size(path):
+    """(width, height) from the file header, without decoding the pixels"""
+    with Image.open(path) as img:
+        return img.size
+
+
+def load_preview(path, max_side):
+    """Decode at 1/2, 1/4 or 1/8 resolution when that still covers max_side
+
+    Returns the image and the reduction factor (1 when decoded in full).
+    """
+    width, height = image_size(path)
+    for factor, flag in REDUCED_COLOR_FLAGS.items():
+        if max(width, height) / factor >= max_side:
+            image = cv2.imread(path, flag)
+            if image is not None:
+                return image, factor
+    return cv2.imread(path), 1
+
+
+def needs_tiling(image):
+    height, width = image.shape[:2]
+    return height * width > TILED_MIN_PIXELS
+
+
+def estimate_parameters_reduced(image, max_side=ANALYSIS_MAX_SIDE):
+    """estimate_parameters on a downscaled copy, with sizes mapped back to full resolution"""
+    scale = max_side / max(image.shape[:2])
+    if scale >= 1.0:
+        return estimate_parameters(preprocess(image))
+
+    small = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    params = estimate_parameters(preprocess(small))
+    for key in ('min_dist', 'min_radius', 'max_radius'):
+        params[key] = int(round(params[key] / scale))
+    return params
+
+
+def tile_windows(height, width, tile_size, overlap):
+    """(core, window) boxes as (x0, y0, x1, y1); cores tile the image exactly"""
+    for y in range(0, height, tile_size):
+        for x in range(0, width, tile_size):
+            core = (x, y, min(width, x + tile_size), min(height, y + tile_size))
+            window = (max(0, x - overlap), max(0, y - overlap),
+                      min(width, core[2] + overlap), min(height, core[3] + overlap))
+            yield core, window
+
+
+def detect_tile(image, core, window, params, path, coarse_max_side):
+    """Detect in one overlapping window; keep circles centred in its core"""
+    x0, y0, x1, y1 = window
+    pre = preprocess(image[y0:y1, x0:x1])
+    circles = detect_circles(pre, params, path, coarse_max_side)
+
+    # Each marker centre lies in exactly one core, so each tile owns its own markers
+    cx = circles[:, 0] + x0
+    cy = circles[:, 1] + y0
+    inside = (cx >= core[0]) & (cx < core[2]) & (cy >= core[1]) & (cy < core[3])
+    circles = circles[inside]
+    scores = score_circles(pre['edges'], circles)
+
+    circles[:, 0] += x0
+    circles[:, 1] += y0
+    return circles, scores
+
+
+def detect_tiled(image, params, path='both', tile_size=TILE_SIZE, workers=None,
+                 coarse_max_side=COARSE_MAX_SIDE, cancelled=None):
+    """detect_circles for very large images, in overlapping tiles across threads
+
+    Tiles are views into `image`; only the tiles being processed hold
+    preprocessing buffers. OpenCV releases the GIL, so threads run in parallel.
+    Circles found twice across a seam are merged by suppress_duplicates.
+    """
+    if path not in PREPROCESS_PATHS:
+        raise ValueError(f"Unknown preprocessing path '{path}'")
+
+    height, width = image.shape[:2]
+    overlap = 2 * params['max_radius'] + params['min_dist'] + TILE_MARGIN
+    windows = list(tile_windows(height, width, tile_size, overlap))
+
+    def run(boxes):
+        if cancelled and cancelled():
+            return np.empty((0, 3), np.float32), np.empty(0, np.float32)
+        return detect_tile(image, boxes[0], boxes[1], params, path, coarse_max_side)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        results = list(executor.map(run, windows))
+
+    circles = np.concatenate([c for c, _ in results])
+    scores = np.concatenate([s for _, s in results])
+    return suppress_duplicates(circles, scores, params['min_dist'])
+
+
+def nodes_from_circles(circles):
+    """PC nodes (all free) for detected circles, numbered in detection order"""
+    return [
+        {'id': i + 1, 'x': int(x), 'y': int(y), 'radius': int(r), 'status': 'free'}
+        for i, (x, y, r) in enumerate(circles)
+    ]
+
+
+def blueprint_config(width, height, nodes):
+    """The exported blueprint configuration (same JSON as the GUI export)"""
+    return {
+        'blueprint_info': {
+            'width': width,
+            'height': height
+        },
+        'nodes': nodes
+    }
+
+
+class DetectionCache:
+    """Auto-detect parameters and detected circles on disk, keyed by image content
+
+    Files are named by the image's SHA-1 (see file_digest) and, for circles,
+    a hash of the detection settings. Opening the same blueprint again with
+    the same settings skips the analysis and Hough passes. Only the
+    `max_settings` most recently used circle results are kept per image.
+    """
+
+    def __init__(self, cache_dir='blueprint_cache', max_settings=CACHED_SETTINGS_PER_IMAGE):
+        self.cache_dir = cache_dir
+        self.max_settings = max_settings
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, digest, settings=None):
+        name = f"{digest}_params.json"
+        if settings is not None:
+            settings_key = hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+            name = f"{digest}_{settings_key[:16]}.json"
+        return os.path.join(self.cache_dir, name)
+
+    def _read(self, path):
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('version') == DETECTION_CACHE_VERSION else None
+
+    def _write(self, path, entry):
+        entry['version'] = DETECTION_CACHE_VERSION
+
+        # Write then rename so another process never reads a half-written file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def settings(self, params, path, coarse_max_side):
+        return {
+            'min_dist': int(params['min_dist']),
+            'min_radius': int(params['min_radius']),
+            'max_radius': int(params['max_radius']),
+            'sensitivity': int(params['sensitivity']),
+            'path': path,
+            'coarse_max_side': coarse_max_side
+        }
+
+    def get_parameters(self, digest):
+        entry = self._read(self._path(digest))
+        return entry['parameters'] if entry else None
+
+    def put_parameters(self, digest, params):
+        parameters = dict(params)
+        parameters['edge_density'] = float(parameters['edge_density'])
+        self._write(self._path(digest), {'parameters': parameters})
+
+    def get_circles(self, digest, params, path, coarse_max_side=COARSE_MAX_SIDE):
+        entry_path = self._path(digest, self.settings(params, path, coarse_max_side))
+        entry = self._read(entry_path)
+        if entry is None:
+            return None
+
+        # A hit counts as a use, so eviction drops the least recently used settings
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return np.array(entry['circles'], np.float32).reshape(-1, 3)
+
+    def put_circles(self, digest, params, path, circles, coarse_max_side=COARSE_MAX_SIDE):
+        settings = self.settings(params, path, coarse_max_side)
+        self._write(self._path(digest, settings), {
+            'settings': settings,
+            'circles': np.asarray(circles, np.float32).tolist()
+        })
+        self.evict(digest)
+
+    def evict(self, digest):
+        """Drop all but the max_settings most recently used circle results of an image"""
+        params_path = self._path(digest)
+        entries = [
+            os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+            if name.startswith(f"{digest}_") and name.endswith('.json')
+        ]
+        entries = [entry for entry in entries if entry != params_path]
+        if len(entries) <= self.max_settings:
+            return
+
+        def last_used(entry):
+            try:
+                return os.path.getmtime(entry)
+            except OSError:
+                return 0.0
+
+        entries.sort(key=last_used, reverse=True)
+        for entry in entries[self.max_settings:]:
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+
+
+class DetectionWorker:
+    """Run detection jobs on one background thread, newest first
+
+    Submitting a job supersedes every earlier one: pending jobs are dropped,
+    a running job sees its `cancelled()` turn True and its result is thrown away.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = None
+        self.generation = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, job, on_done):
+        """Queue job(cancelled) -> result; on_done(generation, result, error) runs on this thread"""
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, job, on_done)
+            self.condition.notify()
+            return self.generation
+
+    def is_current(self, generation):
+        return generation == self.generation
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+                generation, job, on_done = self.pending
+                self.pending = None
+
+            def cancelled(generation=generation):
+                return generation != self.generation
+
+            try:
+                result, error = job(cancelled), None
+            except Exception as e:
+                result, error = None, e
+
+            if not cancelled():
+                on_done(generation, result, error)
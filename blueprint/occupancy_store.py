@@ -0,0 +1,206 @@
+import json
+import sqlite3
+from datetime import datetime
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blueprints (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    nodes TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    blueprint TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    node_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_blueprint ON events (blueprint, seq);
+CREATE TABLE IF NOT EXISTS snapshots (
+    blueprint TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    occupied TEXT NOT NULL,
+    at TEXT NOT NULL,
+    PRIMARY KEY (blueprint, seq)
+);
+"""
+
+STATUSES = ('free', 'occupied')
+
+
+class OccupancyStore:
+    """Blueprint node layouts and their occupancy in SQLite
+
+    A blueprint's layout (node positions) is stored once under its key. Status
+    toggles are appended to `events`. Every `snapshot_every` events the
+    occupied node ids are written to `snapshots` and the events and snapshots
+    it covers are deleted, so loading the current state reads one snapshot
+    plus the few events after it and neither table keeps growing.
+
+    Every saved layout bumps the blueprint's `generation`. Events are stamped
+    with the generation they were made against, so a viewer still showing an
+    older layout neither applies nor writes events by the wrong node ids.
+    """
+
+    def __init__(self, path='blueprint_occupancy.db', snapshot_every=200):
+        self.snapshot_every = snapshot_every
+        self.conn = sqlite3.connect(path)
+
+        # WAL lets other viewers read while this one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def now(self):
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def generation(self, key):
+        row = self.conn.execute(
+            "SELECT generation FROM blueprints WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save_layout(self, key, width, height, nodes, name=None):
+        """Store a new node layout; occupancy restarts from the nodes' statuses
+
+        Returns the layout's generation.
+        """
+        layout = [
+            {'id': node['id'], 'x': node['x'], 'y': node['y'], 'radius': node['radius']}
+            for node in nodes
+        ]
+        occupied = [node['id'] for node in nodes if node['status'] == 'occupied']
+
+        with self.conn:
+            # Bumped in the same statement, so concurrent saves never share a generation
+            self.conn.execute(
+                "INSERT OR REPLACE INTO blueprints (key, name, width, height, nodes, generation, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, "
+                "COALESCE((SELECT generation FROM blueprints WHERE key = ?), 0) + 1, ?)",
+                (key, name, width, height, json.dumps(layout), key, self.now())
+            )
+            generation = self.generation(key)
+
+            # Events of an older layout refer to other node ids
+            self.conn.execute("DELETE FROM events WHERE blueprint = ?", (key,))
+            self.conn.execute("DELETE FROM snapshots WHERE blueprint = ?", (key,))
+            self.conn.execute(
+                "INSERT INTO snapshots (blueprint, seq, occupied, at) VALUES (?, 0, ?, ?)",
+                (key, json.dumps(occupied), self.now())
+            )
+        return generation
+
+    def load(self, key):
+        """Layout and current statuses of a blueprint, or None if it was never stored"""
+        row = self.conn.execute(
+            "SELECT width, height, nodes, generation FROM blueprints WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        width, height, nodes, generation = row
+
+        snapshot = self.conn.execute(
+            "SELECT seq, occupied FROM snapshots WHERE blueprint = ? ORDER BY seq DESC LIMIT 1",
+            (key,)
+        ).fetchone()
+        seq, occupied = snapshot if snapshot else (0, '[]')
+        occupied = set(json.loads(occupied))
+
+        # Replay only the events after the snapshot
+        for seq, node_id, status in self.events_since(key, generation, seq):
+            if status == 'occupied':
+                occupied.add(node_id)
+            else:
+                occupied.discard(node_id)
+
+        nodes = json.loads(nodes)
+        for node in nodes:
+            node['status'] = 'occupied' if node['id'] in occupied else 'free'
+
+        return {'width': width, 'height': height, 'nodes': nodes, 'seq': seq,
+                'generation': generation}
+
+    def record(self, key, node_id, status, generation):
+        """Append one status change made against a layout generation
+
+        Returns its sequence number, or None when the layout has been replaced
+        since (the caller should reload it).
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown node status '{status}'")
+
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO events (blueprint, generation, node_id, status, at) "
+                "SELECT key, generation, ?, ?, ? FROM blueprints WHERE key = ? AND generation = ?",
+                (node_id, status, self.now(), key, generation)
+            )
+            if cursor.rowcount == 0:
+                return None
+            seq = cursor.lastrowid
+
+        pending = self.conn.execute(
+            "SELECT COUNT(*) FROM events WHERE blueprint = ? AND seq > ?",
+            (key, self.snapshot_seq(key))
+        ).fetchone()[0]
+        if pending >= self.snapshot_every:
+            self.snapshot(key)
+        return seq
+
+    def snapshot_seq(self, key):
+        return self.conn.execute(
+            "SELECT MAX(seq) FROM snapshots WHERE blueprint = ?", (key,)
+        ).fetchone()[0] or 0
+
+    def snapshot(self, key):
+        """Write the current occupied node ids as a snapshot at the latest event
+
+        The events up to it and the older snapshots are deleted with it.
+        """
+        state = self.load(key)
+        if state is None:
+            return
+        occupied = [node['id'] for node in state['nodes'] if node['status'] == 'occupied']
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots (blueprint, seq, occupied, at) VALUES (?, ?, ?, ?)",
+                (key, state['seq'], json.dumps(occupied), self.now())
+            )
+            self.conn.execute(
+                "DELETE FROM events WHERE blueprint = ? AND seq <= ?", (key, state['seq'])
+            )
+            self.conn.execute(
+                "DELETE FROM snapshots WHERE blueprint = ? AND seq < ?", (key, state['seq'])
+            )
+
+    def events_since(self, key, generation, seq):
+        return self.conn.execute(
+            "SELECT seq, node_id, status FROM events "
+            "WHERE blueprint = ? AND generation = ? AND seq > ? ORDER BY seq",
+            (key, generation, seq)
+        ).fetchall()
+
+    def changes_since(self, key, seq):
+        """(generation, events) for polling viewers
+
+        `events` are the (seq, node_id, status) changes after seq of the current
+        layout generation, oldest first. A generation other than the viewer's
+        means the layout was replaced and has to be reloaded. `events` is None
+        when the changes after seq were folded into a snapshot; the viewer then
+        reloads too.
+        """
+        generation = self.generation(key)
+        if generation is None:
+            return None, []
+        if seq < self.snapshot_seq(key):
+            return generation, None
+        return generation, self.events_since(key, generation, seq)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,46 @@
+from occupancy_store import OccupancyStore
+
+
+def make_nodes(count):
+    return [{'id': i, 'x': i * 10, 'y': 5, 'radius': 4, 'status': 'free'}
+            for i in range(1, count + 1)]
+
+
+def row_count(store, table):
+    return store.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_snapshots_bound_events_and_snapshots(tmp_path):
+    store = OccupancyStore(str(tmp_path / 'occupancy.db'), snapshot_every=10)
+    generation = store.save_layout('plan', 100, 50, make_nodes(5))
+
+    for i in range(1, 96):
+        status = 'occupied' if i % 2 else 'free'
+        assert store.record('plan', i % 5 + 1, status, generation) is not None
+        assert row_count(store, 'events') < 10
+        assert row_count(store, 'snapshots') == 1
+
+    # Pruning loses no state: the last status recorded for each node
+    expected = {}
+    for i in range(1, 96):
+        expected[i % 5 + 1] = 'occupied' if i % 2 else 'free'
+    state = store.load('plan')
+    assert {node['id']: node['status'] for node in state['nodes']} == expected
+    store.close()
+
+
+def test_viewer_behind_a_snapshot_is_told_to_reload(tmp_path):
+    store = OccupancyStore(str(tmp_path / 'occupancy.db'), snapshot_every=3)
+    generation = store.save_layout('plan', 100, 50, make_nodes(3))
+
+    first = store.record('plan', 1, 'occupied', generation)
+    assert store.changes_since('plan', 0) == (generation, [(first, 1, 'occupied')])
+
+    store.record('plan', 2, 'occupied', generation)
+    store.record('plan', 3, 'occupied', generation)
+    assert store.changes_since('plan', first) == (generation, None)
+
+    state = store.load('plan')
+    assert store.changes_since('plan', state['seq']) == (generation, [])
+    assert all(node['status'] == 'occupied' for node in state['nodes'])
+    store.close()
@@ -1,10 +1,11 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-import threading
-import cv2
-from PIL import Image, ImageTk
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from scanner_core import CaptureConfig, ScanStation
+from label_payload import SCANNER_FORMATS_TEXT, decode_payload
+from stock_ledger import StockLedger
 
 
 class InventoryDashboard:
@@ -17,6 +18,13 @@ class InventoryDashboard:
         # Make window resizable
         self.root.resizable(True, True)
         
+        # Keep one document per (product_id, lot_no) instead of one per scan
+        self.AGGREGATE_LOTS = True
+        self.SCAN_HISTORY_LIMIT = 20
+        
+        # Scan keys are remembered this long, whatever the lot history keeps
+        self.SCAN_KEY_TTL_DAYS = 30
+        
         # MongoDB connection
         self.setup_mongodb()
         
@@ -24,9 +32,14 @@ class InventoryDashboard:
         self.RED_THRESHOLD = 7
         self.YELLOW_THRESHOLD = 30
         
+        # Product catalog cache ({product_id: name}), loaded on first use
+        self.product_catalog = None
+        
         # Scanner state
         self.scanning = False
-        self.camera = None
+        self.scan_station = None
+        self.camera_configs = CaptureConfig.load_all()
+        self.INGEST_INTERVAL_MS = 250
         
         self.setup_ui()
         self.update_dashboard()
@@ -46,6 +59,32 @@ class InventoryDashboard:
             self.batches_collection.create_index('lot_no')
             self.batches_collection.create_index('expiry_date')
             
+            # Scanned batches carry an idempotency key; manual entries have none
+            self.batches_collection.create_index('scan_key', unique=True, sparse=True)
+            
+            # Lot aggregates: quantities are $inc'ed into one document per lot
+            self.lots_collection = self.db['lots']
+            self.lots_collection.create_index([('product_id', 1), ('lot_no', 1)], unique=True)
+            self.lots_collection.create_index('expiry_date')
+            
+            # Seen scan keys for lot aggregates, one document per key (_id); the
+            # capped scan history on each lot is for display only
+            self.scan_keys_collection = self.db['scan_keys']
+            self.scan_keys_collection.create_index(
+                'claimed_at', expireAfterSeconds=self.SCAN_KEY_TTL_DAYS * 86400
+            )
+            
+            if self.AGGREGATE_LOTS:
+                self.stock_collection = self.lots_collection
+                self.fold_batches_into_lots()
+            else:
+                self.stock_collection = self.batches_collection
+            
+            # Movements ledger: receipts, FEFO picks, adjustments and write-offs
+            self.movements_collection = self.db['movements']
+            self.ledger = StockLedger(self.stock_collection, self.movements_collection,
+                                      self.products_collection)
+            
             messagebox.showinfo("Success ", "Connected to MongoDB successfully!")
         except Exception as e:
             messagebox.showerror("Database Error", 
@@ -74,32 +113,234 @@ class InventoryDashboard:
         widget.bind('<Enter>', on_enter)
         widget.bind('<Leave>', on_leave)
     
+    def fold_batches_into_lots(self):
+        """One-time migration: sum existing per-scan batches into lot aggregates"""
+        if self.lots_collection.find_one() is not None or self.batches_collection.find_one() is None:
+            return
+        
+        pipeline = [
+            {'$sort': {'scanned_at': 1}},
+            {'$group': {
+                '_id': {'product_id': '$product_id', 'lot_no': '$lot_no'},
+                'name': {'$last': '$name'},
+                'quantity': {'$sum': '$quantity'},
+                'production_date': {'$last': '$production_date'},
+                'expiry_date': {'$last': '$expiry_date'},
+                'scanned_at': {'$last': '$scanned_at'}
+            }}
+        ]
+        lots = []
+        for lot in self.batches_collection.aggregate(pipeline):
+            key = lot.pop('_id')
+            lot.update(key)
+            lot['scans'] = []
+            lots.append(lot)
+        
+        if lots:
+            self.lots_collection.insert_many(lots, ordered=False)
+        
+        # Scans already counted in the batches stay duplicates after the move
+        claimed_at = datetime.now()
+        scan_keys = [
+            {'_id': batch['scan_key'], 'product_id': batch['product_id'],
+             'lot_no': batch['lot_no'], 'claimed_at': claimed_at}
+            for batch in self.batches_collection.find(
+                {'scan_key': {'$exists': True}}, {'scan_key': 1, 'product_id': 1, 'lot_no': 1}
+            )
+        ]
+        if scan_keys:
+            try:
+                self.scan_keys_collection.insert_many(scan_keys, ordered=False)
+            except BulkWriteError:
+                pass
+    
     def load_inventory(self):
         """Load all batches from MongoDB"""
         try:
-            return list(self.batches_collection.find())
+            return list(self.stock_collection.find())
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load inventory: {str(e)}")
             return []
     
     def save_batch(self, batch_data):
         """Save a batch to MongoDB"""
+        if self.AGGREGATE_LOTS:
+            self.save_lot_scans([batch_data])
+            return None
+        
         try:
             result = self.batches_collection.insert_one(batch_data)
-            return result.inserted_id
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save batch: {str(e)}")
             return None
+        
+        self.record_applied_receipts([batch_data], [])
+        return result.inserted_id
+    
+    def save_batches(self, batches):
+        """Save several batches in one round-trip; returns (inserted, duplicates)
+
+        Batches whose scan_key already exists are rejected by the unique index.
+        """
+        if self.AGGREGATE_LOTS:
+            return self.save_lot_scans(batches)
+        
+        try:
+            result = self.batches_collection.insert_many(batches, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            duplicates = sum(1 for error in write_errors if error.get('code') == 11000)
+            if duplicates < len(write_errors):
+                messagebox.showerror("Error", f"Failed to save batches: {str(e)}")
+            self.record_applied_receipts(batches, write_errors)
+            return e.details.get('nInserted', 0), duplicates
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save batches: {str(e)}")
+            return 0, 0
+        
+        # Batches are saved at this point; a ledger failure is reported on its own
+        self.record_applied_receipts(batches, [])
+        return len(result.inserted_ids), 0
+    
+    def get_product_catalog(self):
+        """Cached {product_id: name} map of the products collection"""
+        if self.product_catalog is None:
+            try:
+                self.product_catalog = {
+                    product['product_id']: product.get('name')
+                    for product in self.products_collection.find({}, {'_id': 0, 'product_id': 1, 'name': 1})
+                }
+            except Exception:
+                return {}
+        return self.product_catalog
+    
+    def invalidate_product_catalog(self):
+        """Drop the cached catalog so the next lookup reloads it from MongoDB"""
+        self.product_catalog = None
+    
+    def claim_scan_keys(self, batches):
+        """Record the scan keys of new scans; returns the indexes of batches seen before
+
+        Keys are the _id of scan_keys documents, so a repeat insert is rejected
+        by MongoDB however old the key is (until the TTL index expires it).
+        """
+        keyed = [(i, batch) for i, batch in enumerate(batches) if batch.get('scan_key')]
+        if not keyed:
+            return set()
+        
+        claimed_at = datetime.now()
+        try:
+            self.scan_keys_collection.insert_many([
+                {
+                    '_id': batch['scan_key'],
+                    'product_id': batch['product_id'],
+                    'lot_no': batch['lot_no'],
+                    'claimed_at': claimed_at
+                }
+                for _, batch in keyed
+            ], ordered=False)
+            return set()
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            if any(error.get('code') != 11000 for error in write_errors):
+                # Do not leave keys behind for scans that will not be saved; keys
+                # that failed were not inserted here (11000: another scan owns them)
+                failed = {error['index'] for error in write_errors}
+                self.release_scan_keys([batch for i, (_, batch) in enumerate(keyed) if i not in failed])
+                raise
+            return {keyed[error['index']][0] for error in write_errors}
+    
+    def release_scan_keys(self, batches):
+        """Forget the keys of scans that were not saved, so a retry is accepted"""
+        keys = [batch['scan_key'] for batch in batches if batch.get('scan_key')]
+        if keys:
+            self.scan_keys_collection.delete_many({'_id': {'$in': keys}})
+    
+    def save_lot_scans(self, batches):
+        """Add scanned quantities to their lot documents; returns (applied, duplicates)
+
+        Scan keys are claimed first in the scan_keys collection; scans whose key
+        was already claimed are duplicates and never reach the lots. The rest
+        are upserts with $inc on quantity and a capped $push onto the lot's
+        scan history.
+        """
+        try:
+            seen = self.claim_scan_keys(batches)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save lots: {str(e)}")
+            return 0, 0
+        
+        batches = [batch for i, batch in enumerate(batches) if i not in seen]
+        if not batches:
+            return 0, len(seen)
+        
+        operations = []
+        for batch in batches:
+            scan = {
+                'quantity': batch['quantity'],
+                'scanned_at': batch.get('scanned_at'),
+                'source': batch.get('source', 'manual'),
+                'scan_key': batch.get('scan_key')
+            }
+            operations.append(UpdateOne(
+                {'product_id': batch['product_id'], 'lot_no': batch['lot_no']},
+                {
+                    '$inc': {'quantity': batch['quantity']},
+                    '$set': {
+                        'name': batch['name'],
+                        'production_date': batch['production_date'],
+                        'expiry_date': batch['expiry_date'],
+                        'scanned_at': batch.get('scanned_at')
+                    },
+                    '$push': {'scans': {'$each': [scan], '$slice': -self.SCAN_HISTORY_LIMIT}}
+                },
+                upsert=True
+            ))
+        
+        try:
+            result = self.lots_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            write_errors = e.details.get('writeErrors', [])
+            messagebox.showerror("Error", f"Failed to save lots: {str(e)}")
+            self.release_scan_keys([batches[error['index']] for error in write_errors])
+            self.record_applied_receipts(batches, write_errors)
+            return e.details.get('nUpserted', 0) + e.details.get('nMatched', 0), len(seen)
+        except Exception as e:
+            self.release_scan_keys(batches)
+            messagebox.showerror("Error", f"Failed to save lots: {str(e)}")
+            return 0, len(seen)
+        
+        # Lots are written at this point; a ledger failure is reported on its own
+        self.record_applied_receipts(batches, [])
+        return result.upserted_count + result.matched_count, len(seen)
+    
+    def record_applied_receipts(self, batches, write_errors):
+        """Log receipts for the batches of a bulk write that did not fail"""
+        failed = {error.get('index') for error in write_errors}
+        try:
+            self.ledger.record_receipts([batch for i, batch in enumerate(batches) if i not in failed])
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to record stock movements: {str(e)}")
     
     def save_product(self, product_data):
         """Save or update a product in MongoDB"""
+        catalog = self.get_product_catalog()
+        product_id = product_data['product_id']
+        
+        # Known product with the same name: nothing to write
+        if set(product_data) == {'product_id', 'name'} and catalog.get(product_id) == product_data['name']:
+            return
+        
         try:
             self.products_collection.update_one(
-                {'product_id': product_data['product_id']},
+                {'product_id': product_id},
                 {'$set': product_data},
                 upsert=True
             )
+            if self.product_catalog is not None:
+                self.product_catalog[product_id] = product_data.get('name', catalog.get(product_id))
         except Exception as e:
+            self.invalidate_product_catalog()
             messagebox.showerror("Error", f"Failed to save product: {str(e)}")
     
     def setup_ui(self):
@@ -357,6 +598,14 @@ class InventoryDashboard:
                              padx=15, pady=12, relief='raised', bd=3,
                              cursor='hand2', width=12, height=2)
         clear_btn.grid(row=0, column=4, padx=8, pady=5)
+        
+        # Stock Movement Button
+        movement_btn = tk.Button(btn_frame, text="📦 Stock\nMovement",
+                                command=self.stock_movement_dialog,
+                                font=('Arial', 11, 'bold'), bg='#16a085', fg='white',
+                                padx=15, pady=12, relief='raised', bd=3,
+                                cursor='hand2', width=12, height=2)
+        movement_btn.grid(row=0, column=5, padx=8, pady=5)
     
     def calculate_days_to_expiry(self, expiry_date_str):
         """Calculate days remaining until expiry"""
@@ -397,7 +646,8 @@ class InventoryDashboard:
         
         # Load batches from MongoDB
         try:
-            batches = list(self.batches_collection.find())
+            # Lots drained by picks and write-offs stay in the ledger but are not listed
+            batches = list(self.stock_collection.find({'quantity': {'$gt': 0}}))
             
             for batch in batches:
                 total_products += 1
@@ -454,10 +704,11 @@ class InventoryDashboard:
                     {'name': {'$regex': search_term, '$options': 'i'}},
                     {'lot_no': {'$regex': search_term, '$options': 'i'}},
                     {'product_id': {'$regex': search_term, '$options': 'i'}}
-                ]
+                ],
+                'quantity': {'$gt': 0}
             }
             
-            batches = list(self.batches_collection.find(query))
+            batches = list(self.stock_collection.find(query))
             
             for batch in batches:
                 days = self.calculate_days_to_expiry(batch['expiry_date'])
@@ -627,6 +878,132 @@ class InventoryDashboard:
                  padx=30, pady=10, relief='raised', bd=3,
                  cursor='hand2').pack(side='left', padx=10)
     
+    def stock_movement_dialog(self):
+        """Open dialog to pick (FEFO), adjust or write off stock"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Stock Movement")
+        dialog.geometry("500x520")
+        dialog.configure(bg='#2d2d44')
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        title = tk.Label(dialog, text="📦 Stock Movement", 
+                        font=('Arial', 18, 'bold'), bg='#2d2d44', fg='white')
+        title.pack(pady=15)
+        
+        movement_type = tk.StringVar(value='pick')
+        type_frame = tk.Frame(dialog, bg='#2d2d44')
+        type_frame.pack(pady=5)
+        
+        for text, value in [("📤 Pick (FEFO)", 'pick'), ("✏️ Adjust", 'adjust'), ("🗑️ Write-off", 'write_off')]:
+            tk.Radiobutton(type_frame, text=text, variable=movement_type, value=value,
+                          font=('Arial', 11), bg='#2d2d44', fg='white',
+                          selectcolor='#1e1e2e', activebackground='#2d2d44').pack(side='left', padx=8)
+        
+        form_frame = tk.Frame(dialog, bg='#2d2d44')
+        form_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        
+        fields = [
+            ("Product ID:", "e.g., PROD001"),
+            ("Lot Number (adjust / write-off):", "e.g., LOT2024001"),
+            ("Quantity (adjust: + or -):", "e.g., 10"),
+            ("Reference / Note:", "e.g., ORDER-1042")
+        ]
+        
+        entries = {}
+        for i, (label_text, placeholder) in enumerate(fields):
+            tk.Label(form_frame, text=label_text, font=('Arial', 11, 'bold'),
+                    bg='#2d2d44', fg='white', anchor='w').grid(row=i*2, column=0, sticky='w', pady=(10, 2))
+            
+            entry = tk.Entry(form_frame, font=('Arial', 11), width=35, relief='solid', bd=1)
+            entry.grid(row=i*2+1, column=0, sticky='ew', pady=(0, 5))
+            entry.insert(0, placeholder)
+            entry.config(fg='gray')
+            
+            def on_focus_in(event, e=entry, ph=placeholder):
+                if e.get() == ph:
+                    e.delete(0, 'end')
+                    e.config(fg='black')
+            
+            def on_focus_out(event, e=entry, ph=placeholder):
+                if e.get() == '':
+                    e.insert(0, ph)
+                    e.config(fg='gray')
+            
+            entry.bind('<FocusIn>', on_focus_in)
+            entry.bind('<FocusOut>', on_focus_out)
+            
+            entries[label_text] = (entry, placeholder)
+        
+        form_frame.columnconfigure(0, weight=1)
+        
+        def value_of(label_text):
+            entry, placeholder = entries[label_text]
+            value = entry.get().strip()
+            return '' if value == placeholder else value
+        
+        def apply_movement():
+            kind = movement_type.get()
+            product_id = value_of("Product ID:")
+            lot_no = value_of("Lot Number (adjust / write-off):")
+            quantity_str = value_of("Quantity (adjust: + or -):")
+            reference = value_of("Reference / Note:") or None
+            
+            if not product_id:
+                messagebox.showerror("Error", "Product ID is required!", parent=dialog)
+                return
+            if kind != 'pick' and not lot_no:
+                messagebox.showerror("Error", "Lot Number is required for adjustments and write-offs!", parent=dialog)
+                return
+            
+            try:
+                quantity = int(quantity_str) if quantity_str else None
+            except ValueError:
+                messagebox.showerror("Error", "Quantity must be a whole number!", parent=dialog)
+                return
+            
+            try:
+                if kind == 'pick':
+                    if quantity is None:
+                        raise ValueError("Quantity is required for a pick")
+                    allocations, shortfall = self.ledger.pick(product_id, quantity, reference)
+                    lines = [f"  {a['lot_no']}: {a['quantity']} units (exp {a['expiry_date']})"
+                             for a in allocations]
+                    message = "Picked from:\n" + ("\n".join(lines) or "  (nothing)")
+                    if shortfall:
+                        message += f"\n\n⚠️ Short by {shortfall} units (only expired stock left)"
+                elif kind == 'adjust':
+                    if not quantity:
+                        raise ValueError("Quantity is required for an adjustment")
+                    lot = self.ledger.adjust(product_id, lot_no, quantity, reference)
+                    message = f"Lot {lot_no} adjusted by {quantity:+d}\nNew quantity: {lot['quantity']}"
+                else:
+                    lot = self.ledger.write_off(product_id, lot_no, quantity, reference)
+                    message = f"Lot {lot_no} written off\nRemaining quantity: {lot['quantity']}"
+            except ValueError as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+                return
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to record movement: {str(e)}", parent=dialog)
+                return
+            
+            self.update_dashboard()
+            dialog.destroy()
+            messagebox.showinfo("✓ Movement Recorded", message)
+        
+        btn_frame = tk.Frame(dialog, bg='#2d2d44')
+        btn_frame.pack(pady=15)
+        
+        tk.Button(btn_frame, text="✔️ Apply", command=apply_movement,
+                 font=('Arial', 12, 'bold'), bg='#27ae60', fg='white',
+                 padx=30, pady=10, relief='raised', bd=3,
+                 cursor='hand2').pack(side='left', padx=10)
+        
+        tk.Button(btn_frame, text="❌ Cancel", command=dialog.destroy,
+                 font=('Arial', 12, 'bold'), bg='#c0392b', fg='white',
+                 padx=30, pady=10, relief='raised', bd=3,
+                 cursor='hand2').pack(side='left', padx=10)
+    
     def toggle_scanner(self):
         """Toggle barcode scanner"""
         if not self.scanning:
@@ -637,6 +1014,9 @@ class InventoryDashboard:
     def start_scanner(self):
         """Start barcode scanner in new window"""
         self.scanning = True
+        
+        # Pick up products added elsewhere since the last session
+        self.invalidate_product_catalog()
         self.scan_btn.config(text="⏹️ Stop Scanner", bg='#c0392b')
         
         self.scanner_window = tk.Toplevel(self.root)
@@ -654,8 +1034,18 @@ class InventoryDashboard:
         camera_frame = tk.Frame(self.scanner_window, bg='#1e1e2e')
         camera_frame.pack(fill='both', expand=True, padx=10, pady=5)
         
-        self.camera_label = tk.Label(camera_frame, bg='black')
-        self.camera_label.pack()
+        # One preview per camera source, tiled two per row
+        configs = self.camera_configs
+        cols = min(len(configs), 2)
+        rows = (len(configs) + cols - 1) // cols
+        preview_size = (860 // cols, 580 // rows)
+        
+        self.scan_station = ScanStation(on_error=self.on_scanner_error)
+        for i, config in enumerate(configs):
+            camera_label = tk.Label(camera_frame, bg='black')
+            camera_label.grid(row=i // cols, column=i % cols, padx=2, pady=2)
+            self.scan_station.add_source(f"Camera {config.device}", config,
+                                         camera_label, preview_size)
         
         status_frame = tk.Frame(self.scanner_window, bg='#2d2d44', height=150)
         status_frame.pack(fill='x', padx=10, pady=10)
@@ -671,7 +1061,7 @@ class InventoryDashboard:
         
         instructions = tk.Label(status_frame, 
                                text="💡 Point your camera at a barcode or QR code\n"
-                                    "Format: PRODUCT_ID|NAME|QTY|LOT|PROD_DATE|EXP_DATE",
+                                    + SCANNER_FORMATS_TEXT,
                                font=('Arial', 9), bg='#2d2d44', fg='#f39c12')
         instructions.pack(pady=5)
         
@@ -689,211 +1079,145 @@ class InventoryDashboard:
                  padx=20, pady=8, relief='raised', bd=3,
                  cursor='hand2').pack(side='left', padx=10)
         
-        threading.Thread(target=self.scan_loop, daemon=True).start()
+        # Each camera runs its own capture/decode thread
+        self.scan_station.start()
+        self.root.after(self.INGEST_INTERVAL_MS, self.poll_scan_queue)
     
-    def scan_loop(self):
-        """Camera scanning loop with enhanced visual feedback"""
-        self.camera = cv2.VideoCapture(0)
-        
-        if not self.camera.isOpened():
-            messagebox.showerror("Error", "Could not open camera!")
-            self.stop_scanner()
+    def on_scanner_error(self, source, message):
+        """Report a camera failure from a worker thread on the Tk thread"""
+        def report():
+            messagebox.showerror("Error", message)
+            if self.scanning and not self.scan_station.running:
+                self.stop_scanner()
+        self.root.after(0, report)
+    
+    def poll_scan_queue(self):
+        """Drain scans queued by all cameras and store them in one batch"""
+        if not self.scanning:
             return
         
-        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        scans = self.scan_station.drain()
+        if scans:
+            self.ingest_scans(scans)
         
-        qr_detector = cv2.QRCodeDetector()
+        self.root.after(self.INGEST_INTERVAL_MS, self.poll_scan_queue)
+    
+    def lookup_product_name(self, product_id):
+        """Product name for labels that only carry the product ID"""
+        return self.get_product_catalog().get(product_id)
+    
+    def is_known_product(self, product_id):
+        """Whether the Product ID is already in the catalog (matches GS1 GTINs)"""
+        return product_id in self.get_product_catalog()
+    
+    def parse_scanned_data(self, data):
+        """Parse a classic, compact or GS1 payload, raising ValueError if invalid"""
+        product_info = decode_payload(data, self.is_known_product)
         
-        try:
-            barcode_detector = cv2.barcode.BarcodeDetector()
-            barcode_available = True
-        except:
-            barcode_detector = None
-            barcode_available = False
+        # Compact/GS1 labels may leave the name out; fall back to the ID if unknown
+        if not product_info['name']:
+            product_info['name'] = (self.lookup_product_name(product_info['product_id'])
+                                    or product_info['product_id'])
         
-        last_scan = ""
-        scan_cooldown = 0
+        return product_info
+    
+    def ingest_scans(self, scans):
+        """Store scans from the ingest queue with a single batch insert"""
+        batches = []
+        errors = []
         
-        while self.scanning and self.camera.isOpened():
-            ret, frame = self.camera.read()
-            if not ret:
-                break
-            
-            display_frame = frame.copy()
-            height, width = display_frame.shape[:2]
-            
-            center_x, center_y = width // 2, height // 2
-            box_size = 300
-            
-            overlay = display_frame.copy()
-            cv2.rectangle(overlay, 
-                         (center_x - box_size, center_y - box_size),
-                         (center_x + box_size, center_y + box_size),
-                         (0, 255, 0), 3)
-            cv2.addWeighted(overlay, 0.3, display_frame, 0.7, 0, display_frame)
-            
-            cv2.putText(display_frame, "Place barcode/QR code in the box", 
-                       (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            if scan_cooldown > 0:
-                cv2.putText(display_frame, f"Cooldown: {scan_cooldown//10}s", 
-                           (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
-            
-            qr_data, bbox, _ = qr_detector.detectAndDecode(display_frame)
-            
-            if bbox is not None and qr_data:
-                bbox = bbox.astype(int)
-                for i in range(len(bbox[0])):
-                    pt1 = tuple(bbox[0][i])
-                    pt2 = tuple(bbox[0][(i+1) % len(bbox[0])])
-                    cv2.line(display_frame, pt1, pt2, (0, 255, 0), 3)
-                
-                cv2.putText(display_frame, "QR Code Detected!", 
-                           (bbox[0][0][0], bbox[0][0][1] - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            barcode_data = None
-            if barcode_available and barcode_detector:
-                try:
-                    retval, barcode_data, decoded_type, points = barcode_detector.detectAndDecode(display_frame)
-                    
-                    if retval and barcode_data and points is not None:
-                        points = points.astype(int)
-                        for i in range(len(points[0])):
-                            pt1 = tuple(points[0][i])
-                            pt2 = tuple(points[0][(i+1) % len(points[0])])
-                            cv2.line(display_frame, pt1, pt2, (255, 0, 0), 3)
-                        
-                        cv2.putText(display_frame, f"{decoded_type} Detected!", 
-                                   (points[0][0][0], points[0][0][1] - 10),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-                except:
-                    pass
-            
-            scanned_data = qr_data or barcode_data
-            
-            if scanned_data and scan_cooldown == 0 and scanned_data != last_scan:
-                success = self.process_scanned_data(scanned_data)
-                if success:
-                    last_scan = scanned_data
-                    scan_cooldown = 30
-                    
-                    cv2.rectangle(display_frame, (0, 0), (width, height), 
-                                (0, 255, 0), 30)
-            
-            if scan_cooldown > 0:
-                scan_cooldown -= 1
+        for source, data, scanned_at, key in scans:
+            try:
+                product_info = self.parse_scanned_data(data)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
             
-            frame_rgb = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
-            img.thumbnail((860, 580), Image.Resampling.LANCZOS)
-            imgtk = ImageTk.PhotoImage(image=img)
+            # Save product to MongoDB
+            product_data = {
+                'product_id': product_info['product_id'],
+                'name': product_info['name']
+            }
+            self.save_product(product_data)
             
-            if hasattr(self, 'camera_label') and self.camera_label.winfo_exists():
-                self.camera_label.imgtk = imgtk
-                self.camera_label.configure(image=imgtk)
-            else:
-                break
+            batches.append({
+                'product_id': product_info['product_id'],
+                'lot_no': product_info['lot_no'],
+                'name': product_info['name'],
+                'quantity': product_info['quantity'],
+                'production_date': product_info['production_date'],
+                'expiry_date': product_info['expiry_date'],
+                'scanned_at': scanned_at,
+                'source': source,
+                'scan_key': key
+            })
+        
+        label_alive = hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists()
+        
+        if not batches:
+            if errors and label_alive:
+                self.last_scan_label.config(text=f"❌ {errors[-1]}", fg='#e74c3c')
+            return
         
-        if self.camera:
-            self.camera.release()
-    
-    def process_scanned_data(self, data):
-        """Process scanned barcode data with MongoDB storage"""
-        try:
-            parts = data.split('|')
-            if len(parts) == 6:
-                product_info = {
-                    'product_id': parts[0],
-                    'name': parts[1],
-                    'quantity': int(parts[2]),
-                    'lot_no': parts[3],
-                    'production_date': parts[4],
-                    'expiry_date': parts[5]
-                }
-                
-                # Save product to MongoDB
-                product_data = {
-                    'product_id': product_info['product_id'],
-                    'name': product_info['name']
-                }
-                self.save_product(product_data)
-                
-                # Save batch to MongoDB
-                batch = {
-                    'product_id': product_info['product_id'],
-                    'lot_no': product_info['lot_no'],
-                    'name': product_info['name'],
-                    'quantity': product_info['quantity'],
-                    'production_date': product_info['production_date'],
-                    'expiry_date': product_info['expiry_date'],
-                    'scanned_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                
-                self.save_batch(batch)
-                self.update_dashboard()
-                
-                days = self.calculate_days_to_expiry(product_info['expiry_date'])
-                status, _ = self.get_expiry_status(days)
-                
-                status_colors = {
-                    'EXPIRED': '#8b0000',
-                    'URGENT': '#e74c3c',
-                    'WARNING': '#f39c12',
-                    'SAFE': '#27ae60',
-                    'UNKNOWN': '#95a5a6'
-                }
-                color = status_colors.get(status, '#95a5a6')
-                
-                if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                    scan_info = (f"✓ {product_info['name']} | "
-                               f"Lot: {product_info['lot_no']} | "
-                               f"Qty: {product_info['quantity']} | "
-                               f"Expiry: {product_info['expiry_date']} | "
-                               f"Status: {status}")
-                    self.last_scan_label.config(text=scan_info, fg=color)
-                
-                self.root.after(0, lambda: messagebox.showinfo(
-                    "✓ Product Scanned Successfully!", 
-                    f"Product: {product_info['name']}\n"
-                    f"Lot Number: {product_info['lot_no']}\n"
-                    f"Quantity: {product_info['quantity']} units\n"
-                    f"Expiry Date: {product_info['expiry_date']}\n"
-                    f"Days Remaining: {days}\n"
-                    f"Status: {status}",
-                    parent=self.scanner_window if hasattr(self, 'scanner_window') else self.root
-                ))
-                
-                return True
-            else:
-                if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                    self.last_scan_label.config(
-                        text=f"❌ Invalid barcode format! Expected 6 parts, got {len(parts)}",
-                        fg='#e74c3c'
-                    )
-                return False
-                
-        except ValueError as e:
-            if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                self.last_scan_label.config(
-                    text=f"❌ Error: Quantity must be a number!",
-                    fg='#e74c3c'
-                )
-            return False
-        except Exception as e:
-            if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                self.last_scan_label.config(
-                    text=f"❌ Error processing barcode: {str(e)}",
-                    fg='#e74c3c'
-                )
-            return False
+        # Save batches to MongoDB; repeats of an already stored scan are rejected
+        inserted, duplicates = self.save_batches(batches)
+        if not inserted:
+            if duplicates and label_alive:
+                self.last_scan_label.config(text="⚠️ Already recorded - duplicate scan ignored",
+                                            fg='#f39c12')
+            return
+        
+        self.update_dashboard()
+        
+        last = batches[-1]
+        days = self.calculate_days_to_expiry(last['expiry_date'])
+        status, _ = self.get_expiry_status(days)
+        
+        status_colors = {
+            'EXPIRED': '#8b0000',
+            'URGENT': '#e74c3c',
+            'WARNING': '#f39c12',
+            'SAFE': '#27ae60',
+            'UNKNOWN': '#95a5a6'
+        }
+        color = status_colors.get(status, '#95a5a6')
+        
+        if label_alive:
+            scan_info = (f"✓ {last['name']} | "
+                       f"Lot: {last['lot_no']} | "
+                       f"Qty: {last['quantity']} | "
+                       f"Expiry: {last['expiry_date']} | "
+                       f"Status: {status} | "
+                       f"{last['source']}")
+            if inserted > 1:
+                scan_info += f"\n(+{inserted - 1} more scans saved in this batch)"
+            if duplicates:
+                scan_info += f"\n({duplicates} duplicate scans ignored)"
+            self.last_scan_label.config(text=scan_info, fg=color)
+        
+        # Single scans keep the confirmation popup; bursts only update the label
+        if inserted == 1 and len(batches) == 1:
+            self.root.after(0, lambda: messagebox.showinfo(
+                "✓ Product Scanned Successfully!", 
+                f"Product: {last['name']}\n"
+                f"Lot Number: {last['lot_no']}\n"
+                f"Quantity: {last['quantity']} units\n"
+                f"Expiry Date: {last['expiry_date']}\n"
+                f"Days Remaining: {days}\n"
+                f"Status: {status}",
+                parent=self.scanner_window if hasattr(self, 'scanner_window') else self.root
+            ))
     
     def stop_scanner(self):
         """Stop barcode scanner"""
         self.scanning = False
-        if self.camera:
-            self.camera.release()
+        if self.scan_station:
+            self.scan_station.stop()
+            
+            # Store anything the cameras queued before stopping
+            scans = self.scan_station.drain()
+            if scans:
+                self.ingest_scans(scans)
         if hasattr(self, 'scanner_window'):
             self.scanner_window.destroy()
         self.scan_btn.config(text="📷 Start Scanner", bg='#27ae60')
@@ -903,7 +1227,7 @@ class InventoryDashboard:
         try:
             report_file = f"inventory_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
             
-            batches = list(self.batches_collection.find().sort('expiry_date', 1))
+            batches = list(self.stock_collection.find({'quantity': {'$gt': 0}}).sort('expiry_date', 1))
             
             with open(report_file, 'w') as f:
                 f.write("="*80 + "\n")
@@ -936,16 +1260,12 @@ class InventoryDashboard:
         try:
             today = datetime.now().strftime("%Y-%m-%d")
             
-            # Find and count expired batches
-            expired_batches = list(self.batches_collection.find({'expiry_date': {'$lt': today}}))
-            removed = len(expired_batches)
-            
-            # Delete expired batches
-            self.batches_collection.delete_many({'expiry_date': {'$lt': today}})
+            # Write expired lots off through the ledger so the history is kept
+            removed, units = self.ledger.write_off_expired(today)
             
             self.update_dashboard()
             
-            messagebox.showinfo("Success", f"Removed {removed} expired products from database")
+            messagebox.showinfo("Success", f"Removed {removed} expired products ({units} units written off)")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to clear expired: {str(e)}")
     
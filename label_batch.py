@@ -0,0 +1,175 @@
+import argparse
+import csv
+import json
+import os
+import re
+import time
+from multiprocessing import Pool
+
+from label_renderer import configure_symbol_cache, create_product_label
+from label_sheets import PAGE_SIZES_MM, SheetLayout, write_sheets
+
+
+def read_manifest(path):
+    """Yield product rows from a CSV or JSONL manifest without loading it all"""
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    else:
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+
+
+def safe_filename(text):
+    """Make a product ID / lot number safe to use in a file name"""
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(text)).strip('_') or 'x'
+
+
+def render_label_job(job):
+    """Process-pool worker: render one label and write it straight to disk
+
+    A label missing its Code128 symbol (data the encoder rejects) is a failed
+    row and is not written.
+    """
+    index, row, output_folder, barcode_type, payload_mode, include_name = job
+    barcode_errors = []
+    try:
+        label, _ = create_product_label(
+            row['product_id'],
+            row['name'],
+            float(row['price']),
+            int(row['quantity']),
+            row['lot_no'],
+            row['production_date'],
+            row['expiry_date'],
+            row.get('barcode_type') or barcode_type,
+            payload_mode,
+            include_name,
+            on_barcode_error=barcode_errors.append
+        )
+        if barcode_errors:
+            return index, None, f"Code128 generation failed: {barcode_errors[0]}"
+
+        filename = os.path.join(
+            output_folder,
+            f"label_{index:06d}_{safe_filename(row['product_id'])}_{safe_filename(row['lot_no'])}.png"
+        )
+        label.save(filename, 'PNG')
+        return index, filename, None
+    except Exception as e:
+        return index, None, f"{type(e).__name__}: {e}"
+
+
+def generate_batch(manifest_path, output_folder, workers=None, barcode_type='both',
+                   payload_mode='legacy', include_name=True, chunksize=8,
+                   progress=None, progress_every=100,
+                   sheet_path=None, sheet_layout=None, symbol_cache_dir=None):
+    """Render every manifest row across a process pool and return a summary
+
+    With `sheet_path`, the rendered labels are also imposed in manifest order
+    onto print-ready PDF/TIFF pages (see label_sheets). With `symbol_cache_dir`,
+    rendered QR/Code128 symbols are kept on disk so reprint runs skip the encoders.
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Rows are streamed to the pool; only paths and errors come back
+    jobs = (
+        (index, row, output_folder, barcode_type, payload_mode, include_name)
+        for index, row in enumerate(read_manifest(manifest_path), start=1)
+    )
+
+    done = 0
+    failed = []
+    written = []
+    start = time.perf_counter()
+
+    initializer, initargs = None, ()
+    if symbol_cache_dir:
+        initializer, initargs = configure_symbol_cache, (2048, symbol_cache_dir)
+
+    with Pool(processes=workers, initializer=initializer, initargs=initargs) as pool:
+        for index, filename, error in pool.imap_unordered(render_label_job, jobs, chunksize):
+            done += 1
+            if error:
+                failed.append({'row': index, 'error': error})
+            elif sheet_path:
+                written.append((index, filename))
+
+            if progress and done % progress_every == 0:
+                elapsed = time.perf_counter() - start
+                progress(done, len(failed), done / elapsed if elapsed > 0 else 0.0)
+
+    pages = 0
+    if sheet_path:
+        written.sort()
+        pages = write_sheets((filename for _, filename in written), sheet_path,
+                             sheet_layout or SheetLayout())
+
+    elapsed = time.perf_counter() - start
+    return {
+        'manifest': manifest_path,
+        'output_folder': output_folder,
+        'rows': done,
+        'labels': done - len(failed),
+        'failed': failed,
+        'sheet': sheet_path,
+        'pages': pages,
+        'seconds': round(elapsed, 3),
+        'labels_per_second': round(done / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render product labels for every row of a CSV/JSONL manifest"
+    )
+    parser.add_argument('manifest',
+                        help="CSV or JSONL with product_id, name, price, quantity, "
+                             "lot_no, production_date, expiry_date")
+    parser.add_argument('-o', '--output', default=os.path.join('product_barcodes', 'batch'),
+                        help="Folder for the rendered PNG labels")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="Worker processes (default: CPU count)")
+    parser.add_argument('--barcode-type', choices=['both', 'barcode', 'qr'], default='both',
+                        help="Default symbol type when a row has no barcode_type")
+    parser.add_argument('--payload', choices=['legacy', 'compact', 'gs1'], default='legacy',
+                        help="Symbol payload encoding (compact/gs1 give smaller symbols)")
+    parser.add_argument('--no-name', action='store_true',
+                        help="Leave the product name out of compact payloads "
+                             "(the dashboards look it up by product ID)")
+    parser.add_argument('--chunksize', type=int, default=8,
+                        help="Rows handed to a worker at a time")
+    parser.add_argument('--symbol-cache', default=None,
+                        help="Folder to persist rendered symbols for reprint runs")
+    parser.add_argument('--sheet', default=None,
+                        help="Also impose the labels onto a print-ready .pdf or .tiff")
+    parser.add_argument('--page', default='a4',
+                        help=f"Sheet page: {', '.join(PAGE_SIZES_MM)} or WIDTHxHEIGHT in mm")
+    parser.add_argument('--dpi', type=int, default=300, help="Sheet resolution")
+    args = parser.parse_args()
+
+    def report(done, failed, rate):
+        print(f"  {done} labels rendered ({failed} failed) - {rate:.1f} labels/s")
+
+    summary = generate_batch(args.manifest, args.output, workers=args.workers,
+                             barcode_type=args.barcode_type, payload_mode=args.payload,
+                             include_name=not args.no_name, chunksize=args.chunksize,
+                             progress=report, sheet_path=args.sheet,
+                             sheet_layout=SheetLayout(args.page, args.dpi),
+                             symbol_cache_dir=args.symbol_cache)
+
+    print("=" * 50)
+    print(f"Labels written: {summary['labels']} -> {os.path.abspath(summary['output_folder'])}")
+    print(f"Failed rows: {len(summary['failed'])}")
+    for failure in summary['failed'][:20]:
+        print(f"  row {failure['row']}: {failure['error']}")
+    if summary['sheet']:
+        print(f"Sheets: {summary['pages']} pages -> {os.path.abspath(summary['sheet'])}")
+    print(f"Time: {summary['seconds']}s ({summary['labels_per_second']} labels/s)")
+
+
+if __name__ == "__main__":
+    main()
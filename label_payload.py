@@ -0,0 +1,250 @@
+import calendar
+import re
+from datetime import date, datetime, timedelta
+
+
+# Payload formats understood by the generator and both dashboards:
+#   legacy   PROD_ID|NAME|QTY|LOT|PROD_DATE|EXP_DATE
+#   compact  ~1|PROD_ID|QTY|LOT|PROD_DAY|SHELF_DAYS[|NAME]
+#            numbers in base 36, PROD_DAY counted from PAYLOAD_EPOCH and
+#            SHELF_DAYS = expiry - production; '|' and '\' in fields escaped with '\'
+#   gs1      (01)GTIN (11)PROD (17)EXP (30)QTY (10)LOT as a GS1 element string
+PAYLOAD_MODES = ('legacy', 'compact', 'gs1')
+
+COMPACT_VERSION = 1
+COMPACT_MARKER = '~'
+PAYLOAD_EPOCH = date(2000, 1, 1)
+
+GS = '\x1d'
+GS1_FIXED_LENGTHS = {'01': 14, '11': 6, '17': 6}
+GS1_VARIABLE_AIS = ('10', '30')
+GS1_SYMBOLOGY_IDS = (']C1', ']Q3', ']d2', ']e0')
+
+# Payload formats accepted by the scanner windows, for their instructions line
+SCANNER_FORMATS_TEXT = (
+    "Legacy: PRODUCT_ID|NAME|QTY|LOT|PROD_DATE|EXP_DATE\n"
+    "Compact: ~1|PRODUCT_ID|QTY|LOT|PROD_DAY|SHELF_DAYS[|NAME] (numbers in base 36)\n"
+    "GS1: (01) GTIN (11) PROD_DATE (17) EXP_DATE (30) QTY (10) LOT"
+)
+
+BASE36 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+FORMAT_TEXTS = {
+    'legacy': "Format: PROD_ID|NAME|QTY|LOT|MFG_DATE|EXP_DATE",
+    'compact': "Format: ~1 compact (ID|QTY|LOT|MFG day|shelf days)",
+    'gs1': "Format: GS1 (01) GTIN (11) MFG (17) EXP (30) QTY (10) LOT",
+}
+
+
+def to_base36(number):
+    if number < 0:
+        return '-' + to_base36(-number)
+    digits = ''
+    while True:
+        number, rem = divmod(number, 36)
+        digits = BASE36[rem] + digits
+        if number == 0:
+            return digits
+
+
+def from_base36(text):
+    return int(text, 36)
+
+
+def parse_date(text):
+    return datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def escape_field(text):
+    return str(text).replace('\\', '\\\\').replace('|', '\\|')
+
+
+def split_escaped(data):
+    """Split on '|' while honouring '\\' escapes"""
+    fields = []
+    current = []
+    chars = iter(data)
+    for ch in chars:
+        if ch == '\\':
+            current.append(next(chars, ''))
+        elif ch == '|':
+            fields.append(''.join(current))
+            current = []
+        else:
+            current.append(ch)
+    fields.append(''.join(current))
+    return fields
+
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+
+def gtin_check_digit(digits):
+    """GS1 mod-10 check digit for the digits that precede it"""
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(digits)))
+    return str((10 - total % 10) % 10)
+
+
+def gtin14(product_id):
+    """A GTIN-8/12/13/14 Product ID zero-padded to the 14 digits of AI (01)
+
+    Anything else is rejected rather than changed; decode_payload matches the
+    padded GTIN back to the Product ID in the caller's catalog.
+    """
+    digits = str(product_id).strip()
+    if (not digits.isdigit() or len(digits) not in GTIN_LENGTHS
+            or gtin_check_digit(digits[:-1]) != digits[-1]):
+        raise ValueError("GS1 mode needs a valid GTIN-8/12/13/14 (with check digit) "
+                         "as the Product ID")
+    return digits.zfill(14)
+
+
+def gtin_candidates(gtin):
+    """Every GTIN-8/12/13/14 that gtin14 pads to this 14-digit GTIN, shortest first"""
+    return [gtin[-length:] for length in GTIN_LENGTHS if not gtin[:-length].strip('0')]
+
+
+def encode_payload(product_id, name, quantity, lot_no, production_date, expiry_date,
+                   mode='legacy', include_name=True):
+    """Encode product data for a label symbol in the given payload mode"""
+    if mode == 'legacy':
+        return f"{product_id}|{name}|{quantity}|{lot_no}|{production_date}|{expiry_date}"
+
+    produced = parse_date(str(production_date))
+    expires = parse_date(str(expiry_date))
+
+    if mode == 'compact':
+        fields = [
+            escape_field(product_id),
+            to_base36(int(quantity)),
+            escape_field(lot_no),
+            to_base36((produced - PAYLOAD_EPOCH).days),
+            to_base36((expires - produced).days),
+        ]
+        if include_name and name:
+            fields.append(escape_field(name))
+        return f"{COMPACT_MARKER}{COMPACT_VERSION}|" + '|'.join(fields)
+
+    if mode == 'gs1':
+        # Variable-length AIs go last; only the one before another AI needs a GS separator
+        return (f"01{gtin14(product_id)}"
+                f"11{produced.strftime('%y%m%d')}"
+                f"17{expires.strftime('%y%m%d')}"
+                f"30{int(quantity)}{GS}"
+                f"10{lot_no}")
+
+    raise ValueError(f"Unknown payload mode '{mode}'")
+
+
+def gs1_date(yymmdd):
+    """GS1 YYMMDD date; DD=00 means the last day of the month"""
+    year, month, day = 2000 + int(yymmdd[0:2]), int(yymmdd[2:4]), int(yymmdd[4:6])
+    if day == 0:
+        day = calendar.monthrange(year, month)[1]
+    return date(year, month, day)
+
+
+def parse_gs1(data):
+    """Split a GS1 element string (raw with GS separators, or with '(AI)' brackets)"""
+    for prefix in GS1_SYMBOLOGY_IDS:
+        if data.startswith(prefix):
+            data = data[len(prefix):]
+            break
+
+    if data.startswith('('):
+        return dict(re.findall(r'\((\d{2})\)([^(]*)', data))
+
+    elements = {}
+    pos = 0
+    while pos < len(data):
+        ai = data[pos:pos + 2]
+        pos += 2
+        if ai in GS1_FIXED_LENGTHS:
+            length = GS1_FIXED_LENGTHS[ai]
+            elements[ai] = data[pos:pos + length]
+            pos += length
+        elif ai in GS1_VARIABLE_AIS:
+            end = data.find(GS, pos)
+            end = len(data) if end == -1 else end
+            elements[ai] = data[pos:end]
+            pos = end + 1
+        else:
+            raise ValueError(f"Unsupported GS1 Application Identifier ({ai})")
+        if pos < len(data) and data[pos] == GS:
+            pos += 1
+    return elements
+
+
+def decode_payload(data, is_known_product=None):
+    """Decode any supported payload into product info; 'name' is None when not encoded
+
+    The zero padding of a GS1 (01) GTIN hides the Product ID's original
+    length, so each GTIN length is tried against `is_known_product` (a
+    product_id -> bool check on the caller's catalog) and the first known one
+    is used. An unknown GTIN gets its shortest form.
+
+    Raises ValueError with a message suitable for the scanner status line.
+    """
+    data = data.strip()
+
+    if data.startswith(COMPACT_MARKER):
+        fields = split_escaped(data)
+        if fields[0] != f"{COMPACT_MARKER}{COMPACT_VERSION}":
+            raise ValueError(f"Unsupported label payload version '{fields[0]}'")
+        if len(fields) not in (6, 7):
+            raise ValueError(f"Invalid compact barcode! Expected 5 or 6 fields, got {len(fields) - 1}")
+        try:
+            quantity = from_base36(fields[2])
+            produced = PAYLOAD_EPOCH + timedelta(days=from_base36(fields[4]))
+            expires = produced + timedelta(days=from_base36(fields[5]))
+        except ValueError:
+            raise ValueError("Invalid compact barcode! Bad quantity or date field")
+        return {
+            'product_id': fields[1],
+            'name': fields[6] if len(fields) == 7 else None,
+            'quantity': quantity,
+            'lot_no': fields[3],
+            'production_date': produced.isoformat(),
+            'expiry_date': expires.isoformat()
+        }
+
+    if '|' in data:
+        parts = data.split('|')
+        if len(parts) < 6:
+            raise ValueError(f"Invalid barcode format! Expected 6 parts, got {len(parts)}")
+
+        try:
+            quantity = int(parts[-4])
+        except ValueError:
+            raise ValueError("Error: Quantity must be a number!")
+
+        # ID and the last four fields never contain '|'; anything in between is the name
+        return {
+            'product_id': parts[0],
+            'name': '|'.join(parts[1:-4]),
+            'quantity': quantity,
+            'lot_no': parts[-3],
+            'production_date': parts[-2],
+            'expiry_date': parts[-1]
+        }
+
+    elements = parse_gs1(data)
+    missing = [ai for ai in ('01', '10', '17', '30') if ai not in elements]
+    if missing:
+        raise ValueError(f"Invalid GS1 barcode! Missing ({')('.join(missing)})")
+    try:
+        quantity = int(elements['30'])
+        expires = gs1_date(elements['17'])
+        produced = gs1_date(elements['11']) if '11' in elements else None
+    except ValueError:
+        raise ValueError("Invalid GS1 barcode! Bad quantity or date field")
+    candidates = gtin_candidates(elements['01'])
+    known = [gtin for gtin in candidates if is_known_product and is_known_product(gtin)]
+    return {
+        'product_id': (known or candidates)[0],
+        'name': None,
+        'quantity': quantity,
+        'lot_no': elements['10'],
+        'production_date': produced.isoformat() if produced else '',
+        'expiry_date': expires.isoformat()
+    }
@@ -0,0 +1,301 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from barcode import Code128
+from barcode.errors import BarcodeError
+from PIL import Image, ImageDraw, ImageFont
+import qrcode
+
+from label_payload import FORMAT_TEXTS, encode_payload
+
+
+# Label layout
+LABEL_WIDTH = 700
+INFO_TOP = 70
+LINE_SPACING = 28
+
+# Font roles used on a label, as (font file, size)
+LABEL_FONTS = {
+    'title': ("arial.ttf", 26),
+    'info': ("arial.ttf", 16),
+    'small': ("arial.ttf", 12),
+    'code': ("courier.ttf", 10),
+}
+
+# Static captions of the info lines; values are drawn right after them
+INFO_CAPTIONS = ["Product ID: ", "Price: ₹", "Quantity: ", "Lot No: ", "Mfg Date: ", "Exp Date: "]
+
+# Render options of the symbols placed on a label; part of the symbol cache key
+CODE128_OPTIONS = {'quiet_zone': 10, 'height': 80}
+CODE128_WIDTH = 680
+QR_OPTIONS = {'box_size': 10, 'border': 4}
+QR_SIZE = 150
+
+
+class SymbolCache:
+    """LRU cache of rendered QR/Code128 symbols, optionally mirrored to PNGs on disk
+
+    Keys are (symbology, payload, render options), so a reprint of the same lot
+    reuses the symbols instead of running the encoders again.
+    """
+
+    def __init__(self, max_entries=2048, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key[0]}_{digest}.png")
+
+    def get(self, key, render):
+        """Return the cached symbol for key, calling render() only on a miss"""
+        with self.lock:
+            symbol = self.entries.get(key)
+            if symbol is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return symbol
+
+        symbol = None
+        path = self._path(key) if self.cache_dir else None
+        if path and os.path.exists(path):
+            try:
+                with Image.open(path) as img:
+                    img.load()
+                    symbol = img.copy()
+            except OSError:
+                symbol = None
+
+        if symbol is None:
+            symbol = render()
+            if path:
+                # Write then rename so parallel workers never read a half-written file
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                symbol.save(tmp_path, 'PNG')
+                os.replace(tmp_path, path)
+
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = symbol
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return symbol
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+symbol_cache = SymbolCache()
+
+
+def configure_symbol_cache(max_entries=2048, cache_dir=None):
+    """Replace the module-wide symbol cache (e.g. to persist it to a folder)"""
+    global symbol_cache
+    symbol_cache = SymbolCache(max_entries, cache_dir)
+    return symbol_cache
+
+
+def encode_product_data(product_id, name, quantity, lot_no, production_date, expiry_date,
+                        payload_mode='legacy', include_name=True):
+    """Encode product data in scanner-compatible format (see label_payload)"""
+    encoded_data = encode_payload(product_id, name, quantity, lot_no, production_date,
+                                  expiry_date, payload_mode, include_name)
+    return encoded_data
+
+
+def create_code128_barcode(encoded_data):
+    """Generate Code128 barcode as an in-memory PIL image, one pixel per module
+
+    The quiet zone is in modules and the height in pixels (CODE128_OPTIONS).
+    """
+    modules = Code128(encoded_data).build()[0]
+    quiet_zone = '0' * CODE128_OPTIONS['quiet_zone']
+    row = bytes(0 if module == '1' else 255 for module in quiet_zone + modules + quiet_zone)
+
+    # Drawn from the module string, so every bar edge falls on a whole pixel
+    barcode_img = Image.frombytes('L', (len(row), 1), row)
+    return barcode_img.resize((len(row), CODE128_OPTIONS['height']), Image.Resampling.NEAREST)
+
+
+def create_qr_code(encoded_data):
+    """Generate QR code"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=QR_OPTIONS['box_size'],
+        border=QR_OPTIONS['border'],
+    )
+    qr.add_data(encoded_data)
+    qr.make(fit=True)
+
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+    return qr_img
+
+
+def get_code128_symbol(encoded_data, width=CODE128_WIDTH):
+    """Code128 symbol scaled to fit the label width, served from the symbol cache
+
+    Modules are enlarged by the largest whole factor that fits `width`, so all
+    bars of a width stay equally wide; only a symbol wider than `width` is shrunk.
+    """
+    def render():
+        barcode_img = create_code128_barcode(encoded_data)
+        factor = width // barcode_img.width
+        if factor >= 1:
+            size = (barcode_img.width * factor, barcode_img.height)
+            return barcode_img.resize(size, Image.Resampling.NEAREST).convert('RGB')
+        return barcode_img.resize((width, barcode_img.height)).convert('RGB')
+
+    key = ('code128', encoded_data, tuple(sorted(CODE128_OPTIONS.items())), width)
+    return symbol_cache.get(key, render)
+
+
+def get_qr_symbol(encoded_data, size=QR_SIZE):
+    """QR symbol scaled to the label size, served from the symbol cache"""
+    def render():
+        return create_qr_code(encoded_data).resize((size, size)).convert('RGB')
+
+    key = ('qr', encoded_data, tuple(sorted(QR_OPTIONS.items())), size)
+    return symbol_cache.get(key, render)
+
+
+@lru_cache(maxsize=None)
+def get_font(font_name, size):
+    """Load a TrueType font once per (name, size), falling back to PIL's default"""
+    try:
+        return ImageFont.truetype(font_name, size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def label_font(role):
+    """Cached font for a label role ('title', 'info', 'small', 'code')"""
+    return get_font(*LABEL_FONTS[role])
+
+
+def label_height_for(barcode_type):
+    return 500 if barcode_type == 'both' else 450
+
+
+@lru_cache(maxsize=None)
+def get_label_template(barcode_type, payload_mode='legacy'):
+    """Pre-render the static parts of a label once per barcode type
+
+    Returns the template image and the x position where each info value starts.
+    """
+    label_width = LABEL_WIDTH
+    label_height = label_height_for(barcode_type)
+    template = Image.new('RGB', (label_width, label_height), 'white')
+    draw = ImageDraw.Draw(template)
+
+    info_font = label_font('info')
+
+    draw.rectangle([5, 5, label_width-5, label_height-5], outline='black', width=3)
+
+    value_x = []
+    y_position = INFO_TOP
+    for caption in INFO_CAPTIONS:
+        draw.text((20, y_position), caption, fill='black', font=info_font)
+        value_x.append(20 + draw.textlength(caption, font=info_font))
+        y_position += LINE_SPACING
+
+    # With a QR code only, its position and caption do not depend on the data
+    if barcode_type == 'qr':
+        qr_y = y_position + 20
+        draw.text((label_width//2, qr_y + 150 + 10), "Scan QR Code",
+                 fill='black', font=label_font('small'), anchor='mt')
+
+    draw.text((label_width//2, label_height - 15), FORMAT_TEXTS[payload_mode],
+             fill='gray', font=label_font('code'), anchor='mt')
+
+    return template, tuple(value_x)
+
+
+def create_product_label(product_id, name, price, quantity, lot_no,
+                         production_date, expiry_date, barcode_type='both',
+                         payload_mode='legacy', include_name=True, on_barcode_error=None):
+    """Create complete product label with barcode/QR code (no Tk required)
+
+    Data Code128 cannot encode (e.g. accented names in a legacy payload) leaves
+    the barcode off the label; `on_barcode_error(error)` is told about it.
+    """
+
+    encoded_data = encode_product_data(product_id, name, quantity, lot_no,
+                                       production_date, expiry_date,
+                                       payload_mode, include_name)
+
+    # Border, captions and footer come from the cached template
+    template, value_x = get_label_template(barcode_type, payload_mode)
+    label = template.copy()
+    label_width = label.width
+    draw = ImageDraw.Draw(label)
+
+    title_font = label_font('title')
+    info_font = label_font('info')
+    small_font = label_font('small')
+
+    y_position = 25
+    draw.text((label_width//2, y_position), name,
+             fill='black', font=title_font, anchor='mt')
+
+    info_values = [
+        f"{product_id}",
+        f"{price:.2f}",
+        f"{quantity} units",
+        f"{lot_no}",
+        f"{production_date}",
+        f"{expiry_date}"
+    ]
+
+    y_position = INFO_TOP
+    for x, value in zip(value_x, info_values):
+        draw.text((x, y_position), value, fill='black', font=info_font)
+        y_position += LINE_SPACING
+
+    current_y = y_position + 20
+
+    if barcode_type in ['barcode', 'both']:
+        try:
+            barcode_resized = get_code128_symbol(encoded_data)
+        except BarcodeError as e:
+            barcode_resized = None
+            if on_barcode_error:
+                on_barcode_error(e)
+
+        if barcode_resized is not None:
+            barcode_width, barcode_height = barcode_resized.size
+
+            barcode_x = (label_width - barcode_width) // 2
+            label.paste(barcode_resized, (barcode_x, current_y))
+            current_y += barcode_height + 5
+
+            draw.text((label_width//2, current_y), "Scan this barcode",
+                     fill='black', font=small_font, anchor='mt')
+
+    if barcode_type in ['qr', 'both']:
+        qr_size = QR_SIZE
+        qr_resized = get_qr_symbol(encoded_data, qr_size)
+
+        if barcode_type == 'both':
+            qr_x = label_width - qr_size - 20
+            qr_y = INFO_TOP
+        else:
+            qr_x = (label_width - qr_size) // 2
+            qr_y = current_y
+
+        label.paste(qr_resized, (qr_x, qr_y))
+
+    return label, encoded_data
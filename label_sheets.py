@@ -0,0 +1,261 @@
+import argparse
+import glob
+import os
+import zlib
+from PIL import Image, TiffImagePlugin
+
+
+# Page sizes in millimetres; on thermal sizes a label's cell is the roll width
+PAGE_SIZES_MM = {
+    'a4': (210.0, 297.0),
+    'letter': (215.9, 279.4),
+    'thermal-4x6': (101.6, 152.4),
+    'thermal-100x150': (100.0, 150.0),
+    'thermal-100x70': (100.0, 70.0),
+}
+
+
+def parse_page_size(page):
+    """Page name from PAGE_SIZES_MM or a custom 'WIDTHxHEIGHT' in mm"""
+    page = page.lower()
+    if page in PAGE_SIZES_MM:
+        return PAGE_SIZES_MM[page]
+    try:
+        width, height = page.split('x')
+        return float(width), float(height)
+    except ValueError:
+        raise ValueError(f"Unknown page size '{page}'. Use one of "
+                         f"{', '.join(PAGE_SIZES_MM)} or WIDTHxHEIGHT in mm")
+
+
+class SheetLayout:
+    """Grid of label slots on a page at a target DPI"""
+
+    def __init__(self, page='a4', dpi=300, label_width_mm=70.0, margin_mm=8.0, gap_mm=3.0):
+        self.dpi = dpi
+        page_w_mm, page_h_mm = parse_page_size(page)
+        self.page_size = (self.mm_to_px(page_w_mm), self.mm_to_px(page_h_mm))
+        self.margin = self.mm_to_px(margin_mm)
+        self.gap = self.mm_to_px(gap_mm)
+
+        # Thermal pages (or label_width_mm=None) give each cell the printable width
+        self.fit_page = label_width_mm is None or page.lower().startswith('thermal')
+        self.label_width = None if self.fit_page else self.mm_to_px(label_width_mm)
+
+        self.cell_size = None
+        self.slots = None
+
+    def mm_to_px(self, mm):
+        return int(round(mm / 25.4 * self.dpi))
+
+    def plan(self, label_size):
+        """Work out the cell size and slot positions from the first label"""
+        label_w, label_h = label_size
+        printable_w = self.page_size[0] - 2 * self.margin
+        printable_h = self.page_size[1] - 2 * self.margin
+
+        if self.fit_page:
+            scale = min(printable_w / label_w, printable_h / label_h)
+        else:
+            scale = min(self.label_width, printable_w) / label_w
+            scale = min(scale, printable_h / label_h)
+
+        cell_w = max(1, int(label_w * scale))
+        cell_h = max(1, int(label_h * scale))
+        self.cell_size = (cell_w, cell_h)
+
+        cols = max(1, (printable_w + self.gap) // (cell_w + self.gap))
+        rows = max(1, (printable_h + self.gap) // (cell_h + self.gap))
+
+        self.slots = [
+            (self.margin + col * (cell_w + self.gap), self.margin + row * (cell_h + self.gap))
+            for row in range(rows)
+            for col in range(cols)
+        ]
+
+    def new_page(self):
+        return Image.new('L', self.page_size, 255)
+
+
+def fit_label(label, cell_size):
+    """The label scaled into a cell-sized image, padded with white
+
+    Labels are enlarged by a whole factor with NEAREST, so every Code128
+    module stays the same number of pixels wide with sharp edges. Only a label
+    larger than the cell is shrunk smoothly (render labels for such DPIs instead).
+    """
+    cell_w, cell_h = cell_size
+    scale = min(cell_w / label.width, cell_h / label.height)
+    if scale >= 1:
+        factor = int(scale)
+        label = label.resize((label.width * factor, label.height * factor),
+                             Image.Resampling.NEAREST)
+    else:
+        label = label.resize((max(1, int(label.width * scale)), max(1, int(label.height * scale))),
+                             Image.Resampling.LANCZOS)
+
+    # Centred across the cell; labels of other heights stay top-aligned
+    cell = Image.new('L', cell_size, 255)
+    cell.paste(label, ((cell_w - label.width) // 2, 0))
+    return cell
+
+
+def impose(labels, layout):
+    """Yield pages one at a time; `labels` may be PIL images or file paths"""
+    page = None
+    slot = 0
+
+    for label in labels:
+        if isinstance(label, str):
+            with Image.open(label) as img:
+                label = img.convert('L')
+        else:
+            label = label.convert('L')
+
+        if layout.slots is None:
+            layout.plan(label.size)
+
+        if page is None:
+            page = layout.new_page()
+
+        page.paste(fit_label(label, layout.cell_size), layout.slots[slot])
+
+        slot += 1
+        if slot == len(layout.slots):
+            yield page
+            page = None
+            slot = 0
+
+    if page is not None:
+        yield page
+
+
+class StreamingPdfWriter:
+    """Write a multi-page PDF one page image at a time"""
+
+    def __init__(self, path, dpi):
+        self.dpi = dpi
+        self.f = open(path, 'wb')
+        self.offsets = {}
+        self.page_ids = []
+
+        # 1 = catalog and 2 = page tree are written last, in close()
+        self.next_id = 3
+
+        self.f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write_obj(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.f.tell()
+        self.f.write(b"%d 0 obj\n" % obj_id)
+        self.f.write(body)
+        if stream is not None:
+            self.f.write(b"\nstream\n")
+            self.f.write(stream)
+            self.f.write(b"\nendstream")
+        self.f.write(b"\nendobj\n")
+
+    def add_page(self, page):
+        gray = page.convert('L')
+        width, height = gray.size
+        data = zlib.compress(gray.tobytes(), 6)
+
+        page_w = width * 72.0 / self.dpi
+        page_h = height * 72.0 / self.dpi
+
+        image_id, content_id, page_id = self.next_id, self.next_id + 1, self.next_id + 2
+        self.next_id += 3
+
+        self._write_obj(image_id, (
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d "
+            b"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode /Length %d >>"
+            % (width, height, len(data))
+        ), data)
+
+        content = b"q %.3f 0 0 %.3f 0 0 cm /Im0 Do Q" % (page_w, page_h)
+        self._write_obj(content_id, b"<< /Length %d >>" % len(content), content)
+
+        self._write_obj(page_id, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.3f %.3f] "
+            b"/Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>"
+            % (page_w, page_h, image_id, content_id)
+        ))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self._write_obj(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+        self._write_obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref_offset = self.f.tell()
+        self.f.write(b"xref\n0 %d\n" % self.next_id)
+        self.f.write(b"0000000000 65535 f \n")
+        for obj_id in range(1, self.next_id):
+            self.f.write(b"%010d 00000 n \n" % self.offsets[obj_id])
+        self.f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (self.next_id, xref_offset))
+        self.f.close()
+
+
+class StreamingTiffWriter:
+    """Write a multi-page TIFF one page image at a time"""
+
+    def __init__(self, path, dpi):
+        self.dpi = dpi
+        self.writer = TiffImagePlugin.AppendingTiffWriter(path, True)
+
+    def add_page(self, page):
+        page.save(self.writer, format='TIFF', compression='tiff_deflate',
+                  dpi=(self.dpi, self.dpi))
+        self.writer.newFrame()
+
+    def close(self):
+        self.writer.close()
+
+
+def write_sheets(labels, path, layout, fmt=None):
+    """Impose labels onto pages and stream them into a PDF or TIFF; returns page count"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+    if fmt == 'pdf':
+        writer = StreamingPdfWriter(path, layout.dpi)
+    elif fmt in ('tif', 'tiff'):
+        writer = StreamingTiffWriter(path, layout.dpi)
+    else:
+        raise ValueError(f"Unsupported sheet format '{fmt}' (use pdf or tiff)")
+
+    pages = 0
+    try:
+        for page in impose(labels, layout):
+            writer.add_page(page)
+            pages += 1
+    finally:
+        writer.close()
+    return pages
+
+
+def iter_label_files(folder, pattern='*.png'):
+    """Label image paths in a folder, in file-name order"""
+    return iter(sorted(glob.glob(os.path.join(folder, pattern))))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tile label images onto print-ready PDF/TIFF pages"
+    )
+    parser.add_argument('folder', help="Folder of rendered label PNGs")
+    parser.add_argument('-o', '--output', required=True, help="Output .pdf or .tiff file")
+    parser.add_argument('--page', default='a4',
+                        help=f"{', '.join(PAGE_SIZES_MM)} or WIDTHxHEIGHT in mm")
+    parser.add_argument('--dpi', type=int, default=300)
+    parser.add_argument('--label-width', type=float, default=70.0,
+                        help="Printed label width in mm (ignored for thermal pages)")
+    parser.add_argument('--margin', type=float, default=8.0, help="Page margin in mm")
+    parser.add_argument('--gap', type=float, default=3.0, help="Gap between labels in mm")
+    args = parser.parse_args()
+
+    layout = SheetLayout(args.page, args.dpi, args.label_width, args.margin, args.gap)
+    pages = write_sheets(iter_label_files(args.folder), args.output, layout)
+    print(f"Wrote {pages} pages to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,657 @@
+import hashlib
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from PIL import Image, ImageTk
+
+
+# Capture backends by name; entries missing from this OpenCV build are skipped
+CAPTURE_BACKENDS = {
+    name: getattr(cv2, attr)
+    for name, attr in [
+        ('auto', 'CAP_ANY'),
+        ('v4l2', 'CAP_V4L2'),
+        ('dshow', 'CAP_DSHOW'),
+        ('msmf', 'CAP_MSMF'),
+        ('avfoundation', 'CAP_AVFOUNDATION'),
+        ('gstreamer', 'CAP_GSTREAMER'),
+    ]
+    if hasattr(cv2, attr)
+}
+
+# Modes tried by the auto-probe, as (fourcc, width, height, fps)
+PROBE_MODES = [
+    (fourcc, width, height, fps)
+    for fourcc in ('MJPG', 'YUYV')
+    for width, height in ((1920, 1080), (1280, 720), (640, 480))
+    for fps in (60, 30)
+]
+
+# Best mode found per (device, backend), so reopening the scanner skips the probe
+_probed_modes = {}
+
+
+class CaptureConfig:
+    """Camera capture settings shared by the dashboards and barcode_scanner.py"""
+
+    def __init__(self, device=0, backend='auto', fourcc='MJPG', width=1280,
+                 height=720, fps=30, buffer_size=1, auto_probe=False,
+                 min_width=640):
+        self.device = device
+        self.backend = backend
+        self.fourcc = fourcc
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+        # 1 keeps only the newest frame so the preview does not lag behind
+        self.buffer_size = buffer_size
+
+        # Probe PROBE_MODES and use the fastest one at least `min_width` wide
+        self.auto_probe = auto_probe
+        self.min_width = min_width
+
+    @classmethod
+    def load(cls, path='scanner_config.json', section='capture'):
+        """Load settings from the `capture` section of a JSON file if present"""
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                settings = json.load(f).get(section, {})
+            return cls(**settings)
+        return cls()
+
+    @classmethod
+    def load_all(cls, path='scanner_config.json'):
+        """Load every camera source: the `cameras` list, else the single `capture`"""
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                settings = json.load(f)
+            if settings.get('cameras'):
+                return [cls(**camera) for camera in settings['cameras']]
+            return [cls(**settings.get('capture', {}))]
+        return [cls()]
+
+    def backend_id(self):
+        """OpenCV API preference for the configured backend name"""
+        return CAPTURE_BACKENDS.get(str(self.backend).lower(), cv2.CAP_ANY)
+
+
+def apply_capture_mode(camera, fourcc, width, height, fps):
+    """Request a capture mode; FOURCC must be set before the frame size"""
+    if fourcc:
+        camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+    if width and height:
+        camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+    if fps:
+        camera.set(cv2.CAP_PROP_FPS, fps)
+
+
+def measure_fps(camera, frames=8):
+    """Grab a few frames and return the delivered frame rate"""
+    # Warm-up grabs flush frames queued under the previous mode
+    for _ in range(2):
+        camera.grab()
+
+    start = time.monotonic()
+    grabbed = 0
+    for _ in range(frames):
+        if camera.grab():
+            grabbed += 1
+    elapsed = time.monotonic() - start
+
+    if grabbed == 0 or elapsed <= 0:
+        return 0.0
+    return grabbed / elapsed
+
+
+def probe_capture_mode(camera, config):
+    """Return the (fourcc, width, height, fps) mode with the highest real FPS"""
+    best_mode, best_score = None, None
+
+    for fourcc, width, height, fps in PROBE_MODES:
+        if width < config.min_width:
+            continue
+
+        apply_capture_mode(camera, fourcc, width, height, fps)
+
+        # Drivers silently fall back to another size; only keep exact matches
+        actual_w = int(camera.get(cv2.CAP_PROP_FRAME_WIDTH))
+        actual_h = int(camera.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        if (actual_w, actual_h) != (width, height):
+            continue
+
+        measured = measure_fps(camera)
+
+        # Round so small timing noise does not beat a larger resolution
+        score = (round(measured / 5), width * height)
+        if best_score is None or score > best_score:
+            best_mode, best_score = (fourcc, width, height, fps), score
+
+    return best_mode
+
+
+def open_camera(config=None):
+    """Open a cv2.VideoCapture configured from a CaptureConfig"""
+    config = config or CaptureConfig()
+    camera = cv2.VideoCapture(config.device, config.backend_id())
+
+    if not camera.isOpened():
+        return camera
+
+    mode = (config.fourcc, config.width, config.height, config.fps)
+    if config.auto_probe:
+        key = (config.device, config.backend_id())
+        if key not in _probed_modes:
+            _probed_modes[key] = probe_capture_mode(camera, config) or mode
+        mode = _probed_modes[key]
+
+    apply_capture_mode(camera, *mode)
+
+    if config.buffer_size:
+        camera.set(cv2.CAP_PROP_BUFFERSIZE, config.buffer_size)
+
+    return camera
+
+
+class ScanScheduler:
+    """Decide which camera frames get a full barcode/QR decode"""
+
+    def __init__(self, symbologies=('qr', 'barcode'), idle_interval=10,
+                 active_hold=15, motion_threshold=4.0, edge_ratio=1.35,
+                 thumb_size=(160, 90)):
+        # Detectors in try order; the last successful one moves to the front
+        self.symbologies = list(symbologies)
+
+        # Idle scenes are decoded once every `idle_interval` frames
+        self.idle_interval = idle_interval
+
+        # Frames to keep decoding every frame after activity was seen
+        self.active_hold = active_hold
+
+        self.motion_threshold = motion_threshold
+        self.edge_ratio = edge_ratio
+        self.thumb_size = thumb_size
+
+        self.prev_thumb = None
+        self.edge_baseline = None
+        self.active_frames = 0
+        self.idle_counter = 0
+
+    def make_thumbnail(self, frame):
+        """Downscale a BGR frame to a small grayscale thumbnail"""
+        thumb = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        if thumb.ndim == 3:
+            thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+        return thumb
+
+    def measure_activity(self, frame):
+        """Return (motion, edge_energy) measured on the thumbnail"""
+        thumb = self.make_thumbnail(frame)
+
+        if self.prev_thumb is None:
+            motion = 0.0
+        else:
+            motion = float(cv2.absdiff(thumb, self.prev_thumb).mean())
+        self.prev_thumb = thumb
+
+        edges = cv2.Laplacian(thumb, cv2.CV_16S, ksize=3)
+        edge_energy = float(cv2.convertScaleAbs(edges).mean())
+
+        return motion, edge_energy
+
+    def should_decode(self, frame):
+        """Cheap gate run on every frame before the detectors"""
+        motion, edge_energy = self.measure_activity(frame)
+
+        # Edge energy of the scene while nothing moves
+        if self.edge_baseline is None:
+            self.edge_baseline = edge_energy
+
+        edge_spike = edge_energy > self.edge_baseline * self.edge_ratio + 1.0
+
+        if motion > self.motion_threshold or edge_spike:
+            self.active_frames = self.active_hold
+
+        # Follow the scene whenever the camera is still, spikes included, so an
+        # object left in view or a lighting change becomes the new idle level
+        if motion <= self.motion_threshold:
+            self.edge_baseline = 0.95 * self.edge_baseline + 0.05 * edge_energy
+
+        if self.active_frames > 0:
+            self.active_frames -= 1
+            self.idle_counter = 0
+            return True
+
+        # Idle: decode at a reduced rate so a still label is still picked up
+        self.idle_counter += 1
+        if self.idle_counter >= self.idle_interval:
+            self.idle_counter = 0
+            return True
+        return False
+
+    def record_candidate(self):
+        """A detector located a code region; decode every frame for a while"""
+        self.active_frames = self.active_hold
+
+    def record_success(self, symbology):
+        """Try the symbology that last decoded successfully first"""
+        self.record_candidate()
+        if symbology in self.symbologies and self.symbologies[0] != symbology:
+            self.symbologies.remove(symbology)
+            self.symbologies.insert(0, symbology)
+
+    def detector_order(self):
+        """Detectors to run on this frame, most recently successful first"""
+        return list(self.symbologies)
+
+
+class RegionTracker:
+    """Remember where a code was decoded and cheaply confirm it stays there"""
+
+    def __init__(self, patch_size=(48, 48), match_threshold=14.0,
+                 max_hold=90, margin=0.1):
+        # Size of the grayscale patch compared between frames
+        self.patch_size = patch_size
+
+        # Mean absolute pixel difference below which the code is "still there"
+        self.match_threshold = match_threshold
+
+        # Frames to trust the patch check before forcing a full re-detection
+        self.max_hold = max_hold
+
+        # Fraction of the quad size added around it before cropping
+        self.margin = margin
+
+        self.clear()
+
+    def clear(self):
+        """Forget the tracked code"""
+        self.quad = None
+        self.data = None
+        self.symbology = None
+        self.template = None
+        self.rect = None
+        self.held_frames = 0
+
+    @property
+    def active(self):
+        return self.template is not None
+
+    def _region_rect(self, frame, quad):
+        """Bounding rectangle of the quad plus margin, clipped to the frame"""
+        height, width = frame.shape[:2]
+        x, y, w, h = cv2.boundingRect(quad.astype(np.float32))
+        pad_x, pad_y = int(w * self.margin), int(h * self.margin)
+
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(width, x + w + pad_x), min(height, y + h + pad_y)
+        if x1 - x0 < 4 or y1 - y0 < 4:
+            return None
+        return x0, y0, x1, y1
+
+    def _patch(self, frame):
+        """Small grayscale patch covering the tracked region"""
+        x0, y0, x1, y1 = self.rect
+        crop = frame[y0:y1, x0:x1]
+        if crop.ndim == 3:
+            crop = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(crop, self.patch_size, interpolation=cv2.INTER_AREA)
+
+    def start(self, frame, quad, data, symbology):
+        """Begin tracking a freshly decoded code given its detector quad"""
+        quad = np.asarray(quad, dtype=np.float32).reshape(-1, 4, 2)[0]
+        rect = self._region_rect(frame, quad)
+        if rect is None:
+            self.clear()
+            return
+
+        self.quad = quad
+        self.data = data
+        self.symbology = symbology
+        self.rect = rect
+        self.template = self._patch(frame)
+        self.held_frames = 0
+
+    def check(self, frame):
+        """Return True while the same code is still in place"""
+        if not self.active:
+            return False
+
+        self.held_frames += 1
+        if self.held_frames > self.max_hold:
+            # Let the detectors confirm the code again; keep `data` so a
+            # re-decode of the same label is recognised as already tracked
+            self.template = None
+            return False
+
+        diff = float(cv2.absdiff(self._patch(frame), self.template).mean())
+        if diff > self.match_threshold:
+            self.clear()
+            return False
+        return True
+
+    def is_tracking(self, data):
+        """True if `data` is the code currently (or just) tracked"""
+        return data is not None and data == self.data
+
+
+class PreviewRenderer:
+    """Draw camera frames into a Tk label through one reused PhotoImage"""
+
+    def __init__(self, label, max_size=(860, 580), max_fps=15):
+        self.label = label
+        self.max_size = max_size
+
+        # Preview refresh is capped independently of the capture rate
+        self.min_interval = 1.0 / max_fps if max_fps else 0.0
+        self.last_render = 0.0
+
+        self.photo = None
+        self.source_shape = None
+        self.target_size = None
+
+    def due(self):
+        """True when enough time has passed to show another preview frame"""
+        return time.monotonic() - self.last_render >= self.min_interval
+
+    def _fit(self, width, height):
+        """Largest size within max_size keeping the aspect ratio (no upscaling)"""
+        max_w, max_h = self.max_size
+        scale = min(max_w / width, max_h / height, 1.0)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def render(self, frame):
+        """Resize once, convert and paste into the existing PhotoImage"""
+        self.last_render = time.monotonic()
+
+        if frame.shape[:2] != self.source_shape:
+            self.source_shape = frame.shape[:2]
+            self.target_size = self._fit(frame.shape[1], frame.shape[0])
+
+        if self.target_size != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, self.target_size, interpolation=cv2.INTER_AREA)
+
+        # Colour conversion runs on the small image, not the full frame
+        img = Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+        if self.photo is None or (self.photo.width(), self.photo.height()) != self.target_size:
+            self.photo = ImageTk.PhotoImage(image=img)
+            self.label.imgtk = self.photo
+            self.label.configure(image=self.photo)
+        else:
+            self.photo.paste(img)
+
+
+class ScanDeduper:
+    """Drop payloads already seen by any camera within a time window"""
+
+    def __init__(self, window=5.0, max_entries=5000):
+        self.window = window
+        self.max_entries = max_entries
+        self.seen = {}
+        self.lock = threading.Lock()
+
+    def accept(self, data):
+        """True if `data` was not seen in the last `window` seconds"""
+        now = time.monotonic()
+        with self.lock:
+            last = self.seen.get(data)
+
+            # A label kept in view refreshes its timestamp, so it never re-enters
+            self.seen[data] = now
+
+            if len(self.seen) > self.max_entries:
+                self.seen = {
+                    key: seen_at for key, seen_at in self.seen.items()
+                    if now - seen_at <= self.window
+                }
+
+            return last is None or now - last > self.window
+
+
+class ScanWorker:
+    """Capture and decode loop for one camera source, run on its own thread"""
+
+    def __init__(self, name, config, submit, label=None, preview_size=(860, 580),
+                 on_error=None):
+        self.name = name
+        self.config = config
+
+        # submit(name, data) -> True when the station accepted the payload
+        self.submit = submit
+        self.on_error = on_error
+
+        self.preview = PreviewRenderer(label, max_size=preview_size) if label is not None else None
+
+        self.running = False
+        self.camera = None
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # The worker thread releases its own camera when the loop exits
+        self.running = False
+
+    def run(self):
+        """Camera scanning loop with enhanced visual feedback"""
+        self.camera = open_camera(self.config)
+
+        if not self.camera.isOpened():
+            self.running = False
+            if self.on_error:
+                self.on_error(self.name, f"Could not open {self.name}!")
+            return
+
+        qr_detector = cv2.QRCodeDetector()
+
+        try:
+            barcode_detector = cv2.barcode.BarcodeDetector()
+            barcode_available = True
+        except:
+            barcode_detector = None
+            barcode_available = False
+
+        # Skip full decoding on idle frames, try the last good symbology first
+        scheduler = ScanScheduler(
+            symbologies=('qr', 'barcode') if barcode_available else ('qr',)
+        )
+        tracker = RegionTracker()
+
+        last_scan = ""
+        scan_cooldown = 0
+
+        while self.running and self.camera.isOpened():
+            ret, frame = self.camera.read()
+            if not ret:
+                break
+
+            display_frame = frame.copy()
+            height, width = display_frame.shape[:2]
+
+            # Guide overlay is only drawn on frames that will be shown
+            show_preview = self.preview is not None and self.preview.due()
+            if show_preview:
+                # Draw scanning guide
+                center_x, center_y = width // 2, height // 2
+                box_size = 300
+
+                # Semi-transparent overlay
+                overlay = display_frame.copy()
+                cv2.rectangle(overlay,
+                              (center_x - box_size, center_y - box_size),
+                              (center_x + box_size, center_y + box_size),
+                              (0, 255, 0), 3)
+                cv2.addWeighted(overlay, 0.3, display_frame, 0.7, 0, display_frame)
+
+                # Add text instructions
+                cv2.putText(display_frame, "Place barcode/QR code in the box",
+                            (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                cv2.putText(display_frame, self.name,
+                            (50, height - 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+
+                if scan_cooldown > 0:
+                    cv2.putText(display_frame, f"Cooldown: {scan_cooldown//10}s",
+                                (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
+
+            qr_data = ""
+            barcode_data = None
+            repeat_scan = False
+
+            # A code decoded earlier that is still in place needs no detection
+            if tracker.check(frame):
+                cv2.polylines(display_frame, [tracker.quad.astype(int)], True,
+                              (0, 255, 255), 3)
+
+            # Try detectors only when the scheduler sees activity (or on the idle tick)
+            elif scheduler.should_decode(frame):
+                for symbology in scheduler.detector_order():
+                    if symbology == 'qr':
+                        # Try QR code detection
+                        qr_data, bbox, _ = qr_detector.detectAndDecode(frame)
+
+                        if bbox is not None:
+                            scheduler.record_candidate()
+
+                        if bbox is not None and qr_data:
+                            # Draw detection box
+                            bbox = bbox.astype(int)
+                            for i in range(len(bbox[0])):
+                                pt1 = tuple(bbox[0][i])
+                                pt2 = tuple(bbox[0][(i+1) % len(bbox[0])])
+                                cv2.line(display_frame, pt1, pt2, (0, 255, 0), 3)
+
+                            cv2.putText(display_frame, "QR Code Detected!",
+                                        (bbox[0][0][0], bbox[0][0][1] - 10),
+                                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+                            scheduler.record_success('qr')
+                            repeat_scan = tracker.is_tracking(qr_data)
+                            tracker.start(frame, bbox, qr_data, 'qr')
+                            break
+
+                    elif symbology == 'barcode':
+                        # Try barcode detection
+                        try:
+                            retval, barcode_data, decoded_type, points = barcode_detector.detectAndDecode(frame)
+
+                            if points is not None:
+                                scheduler.record_candidate()
+
+                            if retval and barcode_data and points is not None:
+                                # Draw detection box
+                                points = points.astype(int)
+                                for i in range(len(points[0])):
+                                    pt1 = tuple(points[0][i])
+                                    pt2 = tuple(points[0][(i+1) % len(points[0])])
+                                    cv2.line(display_frame, pt1, pt2, (255, 0, 0), 3)
+
+                                cv2.putText(display_frame, f"{decoded_type} Detected!",
+                                            (points[0][0][0], points[0][0][1] - 10),
+                                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
+                                scheduler.record_success('barcode')
+                                repeat_scan = tracker.is_tracking(barcode_data)
+                                tracker.start(frame, points, barcode_data, 'barcode')
+                                break
+                        except:
+                            barcode_data = None
+                else:
+                    # Nothing decoded: the previously tracked code has left
+                    tracker.clear()
+
+            # Hand new payloads to the station's shared ingest queue
+            scanned_data = qr_data or barcode_data
+
+            if (scanned_data and scan_cooldown == 0 and scanned_data != last_scan
+                    and not repeat_scan):
+                last_scan = scanned_data
+                if self.submit(self.name, scanned_data):
+                    scan_cooldown = 30  # 3 second cooldown
+
+                    # Visual feedback
+                    cv2.rectangle(display_frame, (0, 0), (width, height),
+                                  (0, 255, 0), 30)
+
+            if scan_cooldown > 0:
+                scan_cooldown -= 1
+
+            # Resize once into the reused preview image, at the capped preview rate
+            if show_preview:
+                if self.preview.label.winfo_exists():
+                    self.preview.render(display_frame)
+                else:
+                    break
+
+        self.running = False
+        self.camera.release()
+
+
+def scan_key(data, station_id, timestamp, window=600):
+    """Deterministic idempotency key for a scan: payload + station + time window
+
+    Scans of the same payload at one station within the same `window`-second
+    slot share a key, so the storage layer can reject the repeats.
+    """
+    slot = int(timestamp // window)
+    raw = f"{station_id}\x00{slot}\x00{data}".encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()
+
+
+class ScanStation:
+    """Several camera workers feeding one deduplicated, batched ingest queue"""
+
+    def __init__(self, dedupe_window=5.0, on_error=None, station_id=None, key_window=600):
+        self.deduper = ScanDeduper(dedupe_window)
+        self.station_id = station_id or socket.gethostname()
+        self.key_window = key_window
+        self.ingest_queue = queue.Queue()
+        self.on_error = on_error
+        self.workers = []
+
+    def add_source(self, name, config, label=None, preview_size=(860, 580)):
+        """Register a camera source with an optional Tk preview label"""
+        worker = ScanWorker(name, config, self.submit, label=label,
+                            preview_size=preview_size, on_error=self.on_error)
+        self.workers.append(worker)
+        return worker
+
+    def submit(self, source, data):
+        """Called from worker threads; queue the scan unless it is a duplicate"""
+        if not self.deduper.accept(data):
+            return False
+        now = datetime.now()
+        scanned_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        key = scan_key(data, self.station_id, now.timestamp(), self.key_window)
+        self.ingest_queue.put((source, data, scanned_at, key))
+        return True
+
+    def drain(self, max_items=200):
+        """Take up to `max_items` queued scans as (source, data, scanned_at, scan_key)"""
+        scans = []
+        while len(scans) < max_items:
+            try:
+                scans.append(self.ingest_queue.get_nowait())
+            except queue.Empty:
+                break
+        return scans
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+    @property
+    def running(self):
+        return any(worker.running for worker in self.workers)
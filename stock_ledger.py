@@ -0,0 +1,203 @@
+from datetime import datetime
+from pymongo import ReturnDocument, UpdateOne
+
+
+MOVEMENT_TYPES = ('receive', 'pick', 'adjust', 'write_off')
+
+
+class StockLedger:
+    """Stock movements against (product_id, lot_no) with FEFO picking
+
+    Lot quantities in the stock collection and per-product `on_hand` totals in
+    the products collection are running balances, moved with $inc by every
+    movement. The movements collection is the append-only record of them.
+    """
+
+    def __init__(self, stock_collection, movements_collection, products_collection):
+        self.stock = stock_collection
+        self.movements = movements_collection
+        self.products = products_collection
+
+        # FEFO walks this index: one product, soonest expiry first. Drained lots
+        # are kept for history, so they are left out of it (partial index)
+        self.stock.create_index(
+            [('product_id', 1), ('expiry_date', 1)],
+            name='fefo_in_stock',
+            partialFilterExpression={'quantity': {'$gt': 0}}
+        )
+        self.movements.create_index([('product_id', 1), ('lot_no', 1), ('at', 1)])
+        self.movements.create_index('at')
+
+        self.backfill_balances()
+
+    def backfill_balances(self):
+        """Seed on_hand once for stock that existed before the ledger"""
+        if self.products.find_one({'on_hand': {'$exists': True}}) is not None:
+            return
+
+        totals = self.stock.aggregate([
+            {'$group': {'_id': '$product_id', 'on_hand': {'$sum': '$quantity'}}}
+        ])
+        for total in totals:
+            self.products.update_one(
+                {'product_id': total['_id']},
+                {'$set': {'on_hand': total['on_hand']}},
+                upsert=True
+            )
+
+    def now(self):
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def on_hand(self, product_id):
+        product = self.products.find_one({'product_id': product_id}, {'on_hand': 1})
+        return product.get('on_hand', 0) if product else 0
+
+    def record_receipts(self, receipts, reference=None):
+        """Log receipts whose lot quantities were already incremented by the caller
+
+        `receipts` are dicts with product_id, lot_no, quantity and optionally
+        scan_key/source; product balances are moved in one bulk write.
+        """
+        if not receipts:
+            return
+
+        at = self.now()
+        self.movements.insert_many([
+            {
+                'type': 'receive',
+                'product_id': receipt['product_id'],
+                'lot_no': receipt['lot_no'],
+                'quantity': receipt['quantity'],
+                'at': at,
+                'reference': receipt.get('scan_key') or reference,
+                'source': receipt.get('source', 'manual')
+            }
+            for receipt in receipts
+        ], ordered=False)
+
+        totals = {}
+        for receipt in receipts:
+            totals[receipt['product_id']] = totals.get(receipt['product_id'], 0) + receipt['quantity']
+        self.products.bulk_write([
+            UpdateOne({'product_id': product_id}, {'$inc': {'on_hand': quantity}}, upsert=True)
+            for product_id, quantity in totals.items()
+        ], ordered=False)
+
+    def apply(self, movement_type, lot_filter, delta, reference=None, note=None):
+        """Move one lot's balance by `delta` and log it; None if the lot is missing or too small"""
+        if movement_type not in MOVEMENT_TYPES:
+            raise ValueError(f"Unknown movement type '{movement_type}'")
+
+        # Outbound moves only match a lot that still holds enough stock
+        condition = dict(lot_filter)
+        if delta < 0:
+            condition['quantity'] = {'$gte': -delta}
+
+        lot = self.stock.find_one_and_update(
+            condition,
+            {'$inc': {'quantity': delta}},
+            return_document=ReturnDocument.AFTER
+        )
+        if lot is None:
+            return None
+
+        self.products.update_one(
+            {'product_id': lot['product_id']},
+            {'$inc': {'on_hand': delta}},
+            upsert=True
+        )
+        self.movements.insert_one({
+            'type': movement_type,
+            'product_id': lot['product_id'],
+            'lot_no': lot['lot_no'],
+            'quantity': delta,
+            'balance': lot['quantity'],
+            'at': self.now(),
+            'reference': reference,
+            'note': note
+        })
+        return lot
+
+    def pick(self, product_id, quantity, reference=None, today=None):
+        """Allocate an outbound quantity across unexpired lots, first-expired-first-out
+
+        Each allocation is one seek on the partial (product_id, expiry_date)
+        index of lots in stock plus a conditional decrement. Returns
+        (allocations, shortfall).
+        """
+        if quantity <= 0:
+            raise ValueError("Pick quantity must be positive")
+
+        available = self.on_hand(product_id)
+        if available < quantity:
+            raise ValueError(f"Only {available} units of {product_id} in stock")
+
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        allocations = []
+        remaining = quantity
+
+        while remaining > 0:
+            lot = self.stock.find_one(
+                {'product_id': product_id, 'quantity': {'$gt': 0}, 'expiry_date': {'$gte': today}},
+                sort=[('expiry_date', 1)]
+            )
+            if lot is None:
+                break
+
+            take = min(remaining, lot['quantity'])
+
+            # Another picker may have drained the lot since the read; just look again
+            if self.apply('pick', {'_id': lot['_id']}, -take, reference) is None:
+                continue
+
+            allocations.append({
+                'lot_no': lot['lot_no'],
+                'expiry_date': lot['expiry_date'],
+                'quantity': take
+            })
+            remaining -= take
+
+        return allocations, remaining
+
+    def adjust(self, product_id, lot_no, delta, note=None):
+        """Correct a lot's quantity by a signed amount (stock count differences)"""
+        if delta == 0:
+            raise ValueError("Adjustment must not be zero")
+        lot = self.apply('adjust', {'product_id': product_id, 'lot_no': lot_no}, delta, note=note)
+        if lot is None:
+            raise ValueError(f"Lot {lot_no} of {product_id} not found or too small for {delta}")
+        return lot
+
+    def write_off(self, product_id, lot_no, quantity=None, note=None):
+        """Write off part of a lot, or all that remains when quantity is None"""
+        lot_filter = {'product_id': product_id, 'lot_no': lot_no}
+        if quantity is None:
+            lot = self.stock.find_one(lot_filter)
+            quantity = lot['quantity'] if lot else 0
+        if quantity <= 0:
+            raise ValueError(f"Nothing to write off for lot {lot_no} of {product_id}")
+
+        lot = self.apply('write_off', lot_filter, -quantity, note=note)
+        if lot is None:
+            raise ValueError(f"Lot {lot_no} of {product_id} not found or holds less than {quantity}")
+        return lot
+
+    def write_off_expired(self, today=None):
+        """Write off every expired lot with stock left; returns (lots, units)"""
+        today = today or datetime.now().strftime("%Y-%m-%d")
+        lots = 0
+        units = 0
+
+        for lot in self.stock.find({'expiry_date': {'$lt': today}, 'quantity': {'$gt': 0}}):
+            if self.apply('write_off', {'_id': lot['_id']}, -lot['quantity'], note='expired'):
+                lots += 1
+                units += lot['quantity']
+
+        return lots, units
+
+    def history(self, product_id, lot_no=None, limit=50):
+        """Most recent movements of a product (or one of its lots)"""
+        query = {'product_id': product_id}
+        if lot_no is not None:
+            query['lot_no'] = lot_no
+        return list(self.movements.find(query).sort('at', -1).limit(limit))
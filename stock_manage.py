@@ -3,9 +3,8 @@ from tkinter import ttk, messagebox
 import json
 import os
 from datetime import datetime
-import threading
-import cv2
-from PIL import Image, ImageTk
+from scanner_core import CaptureConfig, ScanStation
+from label_payload import SCANNER_FORMATS_TEXT, decode_payload
 
 class InventoryDashboard:
     def __init__(self, root):
@@ -20,13 +19,23 @@ class InventoryDashboard:
         self.inventory_file = "inventory_database.json"
         self.inventory = self.load_inventory()
         
+        # Idempotency keys of every stored scan, so repeats are rejected cheaply
+        self.seen_scan_keys = {
+            batch['scan_key']
+            for product in self.inventory.values()
+            for batch in product.get('batches', [])
+            if batch.get('scan_key')
+        }
+        
         # Color thresholds
         self.RED_THRESHOLD = 7
         self.YELLOW_THRESHOLD = 30
         
         # Scanner state
         self.scanning = False
-        self.camera = None
+        self.scan_station = None
+        self.camera_configs = CaptureConfig.load_all()
+        self.INGEST_INTERVAL_MS = 250
         
         self.setup_ui()
         self.update_dashboard()
@@ -622,8 +631,18 @@ class InventoryDashboard:
         camera_frame = tk.Frame(self.scanner_window, bg='#1e1e2e')
         camera_frame.pack(fill='both', expand=True, padx=10, pady=5)
         
-        self.camera_label = tk.Label(camera_frame, bg='black')
-        self.camera_label.pack()
+        # One preview per camera source, tiled two per row
+        configs = self.camera_configs
+        cols = min(len(configs), 2)
+        rows = (len(configs) + cols - 1) // cols
+        preview_size = (860 // cols, 580 // rows)
+        
+        self.scan_station = ScanStation(on_error=self.on_scanner_error)
+        for i, config in enumerate(configs):
+            camera_label = tk.Label(camera_frame, bg='black')
+            camera_label.grid(row=i // cols, column=i % cols, padx=2, pady=2)
+            self.scan_station.add_source(f"Camera {config.device}", config,
+                                         camera_label, preview_size)
         
         # Status frame
         status_frame = tk.Frame(self.scanner_window, bg='#2d2d44', height=150)
@@ -642,7 +661,7 @@ class InventoryDashboard:
         # Instructions
         instructions = tk.Label(status_frame, 
                                text="💡 Point your camera at a barcode or QR code\n"
-                                    "Format: PRODUCT_ID|NAME|QTY|LOT|PROD_DATE|EXP_DATE",
+                                    + SCANNER_FORMATS_TEXT,
                                font=('Arial', 9), bg='#2d2d44', fg='#f39c12')
         instructions.pack(pady=5)
         
@@ -661,231 +680,160 @@ class InventoryDashboard:
                  padx=20, pady=8, relief='raised', bd=3,
                  cursor='hand2').pack(side='left', padx=10)
         
-        # Start camera thread
-        threading.Thread(target=self.scan_loop, daemon=True).start()
+        # Each camera runs its own capture/decode thread
+        self.scan_station.start()
+        self.root.after(self.INGEST_INTERVAL_MS, self.poll_scan_queue)
     
-    def scan_loop(self):
-        """Camera scanning loop with enhanced visual feedback"""
-        self.camera = cv2.VideoCapture(0)
-        
-        if not self.camera.isOpened():
-            messagebox.showerror("Error", "Could not open camera!")
-            self.stop_scanner()
+    def on_scanner_error(self, source, message):
+        """Report a camera failure from a worker thread on the Tk thread"""
+        def report():
+            messagebox.showerror("Error", message)
+            if self.scanning and not self.scan_station.running:
+                self.stop_scanner()
+        self.root.after(0, report)
+    
+    def poll_scan_queue(self):
+        """Drain scans queued by all cameras and store them in one batch"""
+        if not self.scanning:
             return
         
-        # Set higher resolution
-        self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-        self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+        scans = self.scan_station.drain()
+        if scans:
+            self.ingest_scans(scans)
         
-        qr_detector = cv2.QRCodeDetector()
+        self.root.after(self.INGEST_INTERVAL_MS, self.poll_scan_queue)
+    
+    def lookup_product_name(self, product_id):
+        """Product name for labels that only carry the product ID"""
+        for batch in reversed(self.inventory.get(product_id, {}).get('batches', [])):
+            if batch.get('name'):
+                return batch['name']
+        return None
+    
+    def is_known_product(self, product_id):
+        """Whether the Product ID is already in the inventory (matches GS1 GTINs)"""
+        return product_id in self.inventory
+    
+    def parse_scanned_data(self, data):
+        """Parse a classic, compact or GS1 payload, raising ValueError if invalid"""
+        product_info = decode_payload(data, self.is_known_product)
         
-        try:
-            barcode_detector = cv2.barcode.BarcodeDetector()
-            barcode_available = True
-        except:
-            barcode_detector = None
-            barcode_available = False
+        # Compact/GS1 labels may leave the name out; fall back to the ID if unknown
+        if not product_info['name']:
+            product_info['name'] = (self.lookup_product_name(product_info['product_id'])
+                                    or product_info['product_id'])
         
-        last_scan = ""
-        scan_cooldown = 0
+        return product_info
+    
+    def ingest_scans(self, scans):
+        """Add scans from the ingest queue and write the JSON file once"""
+        batches = []
+        errors = []
         
-        while self.scanning and self.camera.isOpened():
-            ret, frame = self.camera.read()
-            if not ret:
-                break
-            
-            display_frame = frame.copy()
-            
-            # Add scanning overlay
-            height, width = display_frame.shape[:2]
-            
-            # Draw scanning guide
-            center_x, center_y = width // 2, height // 2
-            box_size = 300
-            
-            # Semi-transparent overlay
-            overlay = display_frame.copy()
-            cv2.rectangle(overlay, 
-                         (center_x - box_size, center_y - box_size),
-                         (center_x + box_size, center_y + box_size),
-                         (0, 255, 0), 3)
-            cv2.addWeighted(overlay, 0.3, display_frame, 0.7, 0, display_frame)
-            
-            # Add text instructions
-            cv2.putText(display_frame, "Place barcode/QR code in the box", 
-                       (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-            
-            if scan_cooldown > 0:
-                cv2.putText(display_frame, f"Cooldown: {scan_cooldown//10}s", 
-                           (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 165, 255), 2)
-            
-            # Try QR code detection
-            qr_data, bbox, _ = qr_detector.detectAndDecode(display_frame)
-            
-            if bbox is not None and qr_data:
-                # Draw detection box
-                bbox = bbox.astype(int)
-                for i in range(len(bbox[0])):
-                    pt1 = tuple(bbox[0][i])
-                    pt2 = tuple(bbox[0][(i+1) % len(bbox[0])])
-                    cv2.line(display_frame, pt1, pt2, (0, 255, 0), 3)
-                
-                cv2.putText(display_frame, "QR Code Detected!", 
-                           (bbox[0][0][0], bbox[0][0][1] - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-            
-            # Try barcode detection
-            barcode_data = None
-            if barcode_available and barcode_detector:
-                try:
-                    retval, barcode_data, decoded_type, points = barcode_detector.detectAndDecode(display_frame)
-                    
-                    if retval and barcode_data and points is not None:
-                        # Draw detection box
-                        points = points.astype(int)
-                        for i in range(len(points[0])):
-                            pt1 = tuple(points[0][i])
-                            pt2 = tuple(points[0][(i+1) % len(points[0])])
-                            cv2.line(display_frame, pt1, pt2, (255, 0, 0), 3)
-                        
-                        cv2.putText(display_frame, f"{decoded_type} Detected!", 
-                                   (points[0][0][0], points[0][0][1] - 10),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 0, 0), 2)
-                except:
-                    pass
-            
-            # Process scanned data
-            scanned_data = qr_data or barcode_data
-            
-            if scanned_data and scan_cooldown == 0 and scanned_data != last_scan:
-                success = self.process_scanned_data(scanned_data)
-                if success:
-                    last_scan = scanned_data
-                    scan_cooldown = 30  # 3 second cooldown
-                    
-                    # Visual feedback
-                    cv2.rectangle(display_frame, (0, 0), (width, height), 
-                                (0, 255, 0), 30)
+        duplicates = 0
+        
+        for source, data, scanned_at, key in scans:
+            if key in self.seen_scan_keys:
+                duplicates += 1
+                continue
             
-            if scan_cooldown > 0:
-                scan_cooldown -= 1
+            try:
+                product_info = self.parse_scanned_data(data)
+            except ValueError as e:
+                errors.append(str(e))
+                continue
             
-            # Convert and display frame
-            frame_rgb = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-            img = Image.fromarray(frame_rgb)
+            self.seen_scan_keys.add(key)
             
-            # Resize to fit window
-            img.thumbnail((860, 580), Image.Resampling.LANCZOS)
-            imgtk = ImageTk.PhotoImage(image=img)
+            batches.append({
+                'product_id': product_info['product_id'],
+                'lot_no': product_info['lot_no'],
+                'name': product_info['name'],
+                'quantity': product_info['quantity'],
+                'production_date': product_info['production_date'],
+                'expiry_date': product_info['expiry_date'],
+                'scanned_at': scanned_at,
+                'source': source,
+                'scan_key': key
+            })
+        
+        label_alive = hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists()
+        
+        if not batches:
+            if errors and label_alive:
+                self.last_scan_label.config(text=f"❌ {errors[-1]}", fg='#e74c3c')
+            elif duplicates and label_alive:
+                self.last_scan_label.config(text="⚠️ Already recorded - duplicate scan ignored",
+                                            fg='#f39c12')
+            return
+        
+        # Append every batch, then sort and save once for the whole drain
+        touched = set()
+        for batch in batches:
+            product_id = batch['product_id']
+            if product_id not in self.inventory:
+                self.inventory[product_id] = {'batches': []}
             
-            if hasattr(self, 'camera_label') and self.camera_label.winfo_exists():
-                self.camera_label.imgtk = imgtk
-                self.camera_label.configure(image=imgtk)
-            else:
-                break
-        
-        if self.camera:
-            self.camera.release()
-    
-    def process_scanned_data(self, data):
-        """Process scanned barcode data with enhanced feedback"""
-        try:
-            parts = data.split('|')
-            if len(parts) == 6:
-                product_info = {
-                    'product_id': parts[0],
-                    'name': parts[1],
-                    'quantity': int(parts[2]),
-                    'lot_no': parts[3],
-                    'production_date': parts[4],
-                    'expiry_date': parts[5]
-                }
-                
-                product_id = product_info['product_id']
-                
-                if product_id not in self.inventory:
-                    self.inventory[product_id] = {'batches': []}
-                
-                batch = {
-                    'lot_no': product_info['lot_no'],
-                    'name': product_info['name'],
-                    'quantity': product_info['quantity'],
-                    'production_date': product_info['production_date'],
-                    'expiry_date': product_info['expiry_date'],
-                    'scanned_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                
-                self.inventory[product_id]['batches'].append(batch)
-                self.inventory[product_id]['batches'].sort(key=lambda x: x['expiry_date'])
-                
-                self.save_inventory()
-                self.update_dashboard()
-                
-                # Calculate expiry status
-                days = self.calculate_days_to_expiry(product_info['expiry_date'])
-                status, _ = self.get_expiry_status(days)
-                
-                # Status color
-                status_colors = {
-                    'EXPIRED': '#8b0000',
-                    'URGENT': '#e74c3c',
-                    'WARNING': '#f39c12',
-                    'SAFE': '#27ae60',
-                    'UNKNOWN': '#95a5a6'
-                }
-                color = status_colors.get(status, '#95a5a6')
-                
-                # Update last scan label
-                if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                    scan_info = (f"✓ {product_info['name']} | "
-                               f"Lot: {product_info['lot_no']} | "
-                               f"Qty: {product_info['quantity']} | "
-                               f"Expiry: {product_info['expiry_date']} | "
-                               f"Status: {status}")
-                    self.last_scan_label.config(text=scan_info, fg=color)
-                
-                # Show notification
-                self.root.after(0, lambda: messagebox.showinfo(
-                    "✓ Product Scanned Successfully!", 
-                    f"Product: {product_info['name']}\n"
-                    f"Lot Number: {product_info['lot_no']}\n"
-                    f"Quantity: {product_info['quantity']} units\n"
-                    f"Expiry Date: {product_info['expiry_date']}\n"
-                    f"Days Remaining: {days}\n"
-                    f"Status: {status}",
-                    parent=self.scanner_window if hasattr(self, 'scanner_window') else self.root
-                ))
-                
-                return True
-            else:
-                # Invalid format
-                if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                    self.last_scan_label.config(
-                        text=f"❌ Invalid barcode format! Expected 6 parts, got {len(parts)}",
-                        fg='#e74c3c'
-                    )
-                return False
-                
-        except ValueError as e:
-            if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                self.last_scan_label.config(
-                    text=f"❌ Error: Quantity must be a number!",
-                    fg='#e74c3c'
-                )
-            return False
-        except Exception as e:
-            if hasattr(self, 'last_scan_label') and self.last_scan_label.winfo_exists():
-                self.last_scan_label.config(
-                    text=f"❌ Error processing barcode: {str(e)}",
-                    fg='#e74c3c'
-                )
-            return False
+            self.inventory[product_id]['batches'].append(
+                {key: value for key, value in batch.items() if key != 'product_id'}
+            )
+            touched.add(product_id)
+        
+        for product_id in touched:
+            self.inventory[product_id]['batches'].sort(key=lambda x: x['expiry_date'])
+        
+        self.save_inventory()
+        self.update_dashboard()
+        
+        last = batches[-1]
+        days = self.calculate_days_to_expiry(last['expiry_date'])
+        status, _ = self.get_expiry_status(days)
+        
+        status_colors = {
+            'EXPIRED': '#8b0000',
+            'URGENT': '#e74c3c',
+            'WARNING': '#f39c12',
+            'SAFE': '#27ae60',
+            'UNKNOWN': '#95a5a6'
+        }
+        color = status_colors.get(status, '#95a5a6')
+        
+        if label_alive:
+            scan_info = (f"✓ {last['name']} | "
+                       f"Lot: {last['lot_no']} | "
+                       f"Qty: {last['quantity']} | "
+                       f"Expiry: {last['expiry_date']} | "
+                       f"Status: {status} | "
+                       f"{last['source']}")
+            if len(batches) > 1:
+                scan_info += f"\n(+{len(batches) - 1} more scans saved in this batch)"
+            if duplicates:
+                scan_info += f"\n({duplicates} duplicate scans ignored)"
+            self.last_scan_label.config(text=scan_info, fg=color)
+        
+        # Single scans keep the confirmation popup; bursts only update the label
+        if len(batches) == 1:
+            self.root.after(0, lambda: messagebox.showinfo(
+                "✓ Product Scanned Successfully!", 
+                f"Product: {last['name']}\n"
+                f"Lot Number: {last['lot_no']}\n"
+                f"Quantity: {last['quantity']} units\n"
+                f"Expiry Date: {last['expiry_date']}\n"
+                f"Days Remaining: {days}\n"
+                f"Status: {status}",
+                parent=self.scanner_window if hasattr(self, 'scanner_window') else self.root
+            ))
     
     def stop_scanner(self):
         """Stop barcode scanner"""
         self.scanning = False
-        if self.camera:
-            self.camera.release()
+        if self.scan_station:
+            self.scan_station.stop()
+            
+            # Store anything the cameras queued before stopping
+            scans = self.scan_station.drain()
+            if scans:
+                self.ingest_scans(scans)
         if hasattr(self, 'scanner_window'):
             self.scanner_window.destroy()
         self.scan_btn.config(text="📷 Start Scanner", bg='#27ae60')
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from barcode.charsets import code128
+
+from label_renderer import LABEL_WIDTH, create_product_label
+from label_sheets import SheetLayout, impose
+
+
+PATTERNS = {pattern: value for value, pattern in enumerate(code128.CODES)}
+CHARSETS = {
+    'A': {value: char for char, value in code128.A.items() if len(char) == 1},
+    'B': {value: char for char, value in code128.B.items() if len(char) == 1},
+}
+START_CODES = {value: charset for charset, value in code128.START_CODES.items()}
+SWITCH_CODES = {99: 'C', 100: 'B', 101: 'A'}
+
+
+def bar_widths(row):
+    """Widths of the alternating bars and spaces between the first and last bar"""
+    dark = np.flatnonzero(row < 128)
+    bars = (row[dark[0]:dark[-1] + 1] < 128).astype(np.int8)
+    edges = np.flatnonzero(np.diff(bars)) + 1
+    return np.diff(np.concatenate(([0], edges, [len(bars)])))
+
+
+def decode_code128(widths):
+    """Decode a Code128 scanline: 6 elements (11 modules) per symbol, then stop"""
+    values = []
+    for i in range(0, len(widths) - 7, 6):
+        group = widths[i:i + 6]
+        module = group.sum() / 11
+        pattern = ''.join(('1' if j % 2 == 0 else '0') * int(round(width / module))
+                          for j, width in enumerate(group))
+        values.append(PATTERNS[pattern])
+
+    start, *data, check = values
+    assert (start + sum(i * value for i, value in enumerate(data, 1))) % 103 == check
+
+    charset = START_CODES[start]
+    text = ''
+    for value in data:
+        if value in SWITCH_CODES and (charset != 'C' or value != 99):
+            charset = SWITCH_CODES[value]
+        elif charset == 'C':
+            text += f"{value:02d}"
+        else:
+            text += CHARSETS[charset][value]
+    return text
+
+
+@pytest.mark.parametrize('layout', [
+    SheetLayout('a4', 300),
+    SheetLayout('a4', 300, None),
+    SheetLayout('thermal-4x6', 300),
+    SheetLayout('a4', 600),
+])
+@pytest.mark.parametrize('payload_mode', ['legacy', 'gs1'])
+def test_barcode_decodes_from_imposed_page(layout, payload_mode):
+    label, data = create_product_label('4006381333931', 'Green Tea', 4.5, 24, 'LOT2026A',
+                                       '2026-01-01', '2026-12-31', 'barcode', payload_mode)
+    page = np.array(next(impose([label, label], layout)))
+
+    cell_w, cell_h = layout.cell_size
+    factor = int(min(cell_w / label.width, cell_h / label.height))
+    assert factor >= 1
+
+    # Inside the label border, on the scanline crossing the most edges (the bars)
+    left = (cell_w - LABEL_WIDTH * factor) // 2 + 10 * factor
+    right = left + (LABEL_WIDTH - 20) * factor
+    for x, y in layout.slots[:2]:
+        cell = page[y:y + cell_h, x + left:x + right]
+        edges = np.abs(np.diff((cell < 128).astype(np.int8), axis=1)).sum(axis=1)
+        widths = bar_widths(cell[int(np.argmax(edges))])
+
+        # Whole-factor NEAREST scaling: every bar and space is a multiple of the factor
+        assert np.all(widths % factor == 0)
+        assert decode_code128(widths) == data